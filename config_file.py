@@ -0,0 +1,54 @@
+"""JSON config file helpers shared by user_config and workspace_manager"""
+import os
+import json
+import shutil
+import tempfile
+
+# Optional fast JSON parser/serializer for the config files
+try:
+    import orjson
+
+    json_loads = orjson.loads
+
+    def json_dumps_indented(data):
+        """Serialize data as indented UTF-8 JSON bytes"""
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps_indented(data):
+        """Serialize data as indented UTF-8 JSON bytes"""
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def stat_key(path):
+    """Key identifying the current version of a file
+
+    Every save replaces the file, so the inode changes even when a same-size
+    write lands within one mtime tick.
+    """
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def write_atomic(path, data):
+    """Write bytes to a file by replacing it, so readers never see a partial file
+
+    An existing file keeps its permissions; a new one is created readable by
+    its owner only (mkstemp's 0600).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            shutil.copymode(path, tmp_path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
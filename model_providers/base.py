@@ -45,6 +45,33 @@ class ModelProvider(ABC):
             ModelResponse: 统一的响应对象
         """
     
+    def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Any]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        **kwargs
+    ) -> ModelResponse:
+        """以流式方式调用模型进行对话
+        
+        每收到一段文本就调用 on_token，最终返回拼装完整的响应对象。
+        默认实现不支持流式：直接调用 chat()，再把完整内容一次性交给 on_token。
+        支持流式的提供者应重写此方法。
+        
+        Args:
+            messages: 消息历史列表
+            tools: 工具列表，格式由具体提供者决定
+            on_token: 可选回调，接收每段增量文本
+            **kwargs: 其他提供者特定的参数
+        
+        Returns:
+            ModelResponse: 统一的响应对象
+        """
+        response = self.chat(messages=messages, tools=tools, **kwargs)
+        if on_token and response.content:
+            on_token(response.content)
+        return response
+    
     @abstractmethod
     def convert_tools(
         self,
@@ -83,6 +83,51 @@ class OllamaProvider(ModelProvider):
         # 转换响应格式
         return self._convert_response(response)
     
+    def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Any]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        **kwargs
+    ) -> ModelResponse:
+        """以流式方式调用 Ollama 模型
+        
+        Args:
+            messages: 消息历史列表
+            tools: 工具列表
+            on_token: 可选回调，接收每段增量文本
+            **kwargs: 其他参数
+        
+        Returns:
+            ModelResponse: 拼装完整的响应对象
+        """
+        call_kwargs = {
+            'model': self.model,
+            'messages': messages,
+            'stream': True,
+        }
+        if tools is not None:
+            call_kwargs['tools'] = tools
+        call_kwargs.update(kwargs)
+        
+        content_parts = []
+        tool_calls = []
+        try:
+            for chunk in self.client.chat(**call_kwargs):
+                # 复用非流式的转换逻辑解析每个分片
+                partial = self._convert_response(chunk)
+                if partial.content:
+                    content_parts.append(partial.content)
+                    if on_token:
+                        on_token(partial.content)
+                tool_calls.extend(partial.tool_calls)
+        except Exception as e:
+            return ModelResponse(
+                content=f"Error: Failed to call Ollama model: {str(e)}"
+            )
+        
+        return ModelResponse(content=''.join(content_parts), tool_calls=tool_calls)
+    
     def _convert_response(self, ollama_response) -> ModelResponse:
         """将 Ollama 响应转换为统一的 ModelResponse 格式
         
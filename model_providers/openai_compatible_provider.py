@@ -13,6 +13,13 @@ from typing import List, Dict, Any, Optional, Callable
 from .base import ModelProvider
 from .response import ModelResponse, ToolCall
 
+# Optional fast JSON parser for tool call arguments
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 try:
     from openai import OpenAI
     OPENAI_AVAILABLE = True
@@ -128,6 +135,84 @@ class OpenAICompatibleProvider(ModelProvider):
         # Convert response format
         return self._convert_response(response)
     
+    def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Any]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        **kwargs
+    ) -> ModelResponse:
+        """Call model with a streaming response
+        
+        Text deltas are forwarded to on_token as they arrive. Tool call fragments
+        are accumulated by index and parsed once the stream is complete.
+        
+        Args:
+            messages: Message history list
+            tools: Tool list (OpenAI-format tool dictionary list)
+            on_token: Optional callback receiving each text delta
+            **kwargs: Other parameters (e.g., temperature, max_tokens, etc.)
+        
+        Returns:
+            ModelResponse: Unified response object assembled from the stream
+        """
+        call_kwargs = {
+            'model': self.model,
+            'messages': messages,
+            'stream': True,
+        }
+        if tools is not None:
+            call_kwargs['tools'] = tools
+            if 'tool_choice' not in kwargs:
+                call_kwargs['tool_choice'] = 'auto'
+        call_kwargs.update(kwargs)
+        
+        content_parts = []
+        # index -> {'id': ..., 'name': ..., 'arguments': [...]}
+        tool_call_parts: Dict[int, Dict[str, Any]] = {}
+        try:
+            for chunk in self.client.chat.completions.create(**call_kwargs):
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                
+                text = getattr(delta, 'content', None)
+                if text:
+                    content_parts.append(text)
+                    if on_token:
+                        on_token(text)
+                
+                for tc_delta in getattr(delta, 'tool_calls', None) or []:
+                    part = tool_call_parts.setdefault(
+                        tc_delta.index, {'id': None, 'name': None, 'arguments': []}
+                    )
+                    if tc_delta.id:
+                        part['id'] = tc_delta.id
+                    func = tc_delta.function
+                    if func is not None:
+                        if func.name:
+                            part['name'] = func.name
+                        if func.arguments:
+                            part['arguments'].append(func.arguments)
+        except Exception as e:
+            provider_name = self._get_provider_name()
+            return ModelResponse(
+                content=f"Error: Failed to call {provider_name} model: {str(e)}"
+            )
+        
+        tool_calls = []
+        for index in sorted(tool_call_parts):
+            part = tool_call_parts[index]
+            if not part['name']:
+                continue
+            try:
+                tool_args = _json_loads(''.join(part['arguments']) or '{}')
+            except (json.JSONDecodeError, TypeError):
+                tool_args = {}
+            tool_calls.append(ToolCall(name=part['name'], arguments=tool_args, tool_call_id=part['id']))
+        
+        return ModelResponse(content=''.join(content_parts), tool_calls=tool_calls)
+    
     def _convert_response(self, api_response) -> ModelResponse:
         """Convert API response to unified ModelResponse format
         
@@ -162,7 +247,7 @@ class OpenAICompatibleProvider(ModelProvider):
                     try:
                         # Try to parse JSON string
                         if isinstance(tool_args_str, str):
-                            tool_args = json.loads(tool_args_str)
+                            tool_args = _json_loads(tool_args_str)
                         else:
                             tool_args = tool_args_str
                     except (json.JSONDecodeError, TypeError):
@@ -182,7 +267,7 @@ class OpenAICompatibleProvider(ModelProvider):
                     
                     try:
                         if isinstance(tool_args_str, str):
-                            tool_args = json.loads(tool_args_str)
+                            tool_args = _json_loads(tool_args_str)
                         else:
                             tool_args = tool_args_str
                     except (json.JSONDecodeError, TypeError):
@@ -8,9 +8,10 @@ using various model providers (Ollama, OpenAI, etc.) with tool calling capabilit
 """
 
 import os
+import json
 import inspect
+import functools
 from typing import Dict, Callable, Optional, Tuple, Any
-from datetime import datetime
 
 # TOML support
 try:
@@ -21,12 +22,25 @@ except ImportError:
     except ImportError:
         tomllib = None
 
+# Optional fast JSON parser for tool call arguments
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Import model provider abstraction
 from model_providers import create_provider, ModelProvider, ModelResponse
 
 # Import all tool functions from MCP server
 import mcp_server
 
+# User preferences (language)
+import user_config
+
+# Time/Date utility functions (shared with the tool registry)
+from time_utils import get_current_time, get_current_date, get_current_datetime
+
 # Import tool registry system (optional - for new tool registration)
 try:
     from tool_registry import get_registry
@@ -119,6 +133,41 @@ def extract_function(tool_obj):
     return tool_obj
 
 
+# MCP server tools exposed to the agent (used by the fallback path)
+_MCP_FUNC_NAMES = (
+    # Workspace management
+    'get_current_workspace_name',
+    'list_all_workspaces',
+    'switch_workspace',
+    'create_workspace',
+    'delete_workspace',
+    'rename_workspace',
+    
+    # Task management
+    'list_tasks',
+    'add_task',
+    'add_task_with_parent',
+    'update_task',
+    'update_task_comments_from_file',
+    'toggle_task',
+    'delete_task',
+    'get_task',
+    'search_tasks',
+    'search_tasks_all_workspaces',
+    'set_current_task',
+    'clear_current_task',
+    'get_current_task',
+    'move_task_as_child',
+    'move_task_after',
+    'move_task_to_root',
+    'reorder_task',
+    'find_dangling_tasks',
+)
+
+# Resolve the underlying functions once at import
+_MCP_FUNCS = {name: extract_function(getattr(mcp_server, name)) for name in _MCP_FUNC_NAMES}
+
+
 def build_tool_dict(tool_obj):
     """Build tool description dictionary from FastMCP tool object
     
@@ -128,7 +177,7 @@ def build_tool_dict(tool_obj):
     Returns:
         Dictionary in standard tool format (compatible with Ollama and OpenAI) with name, description, and parameters
     """
-    if hasattr(tool_obj, 'name') and hasattr(tool_obj, 'description') and hasattr(tool_obj, 'parameters'):
+    try:
         # FastMCP tool object
         return {
             'type': 'function',
@@ -138,7 +187,49 @@ def build_tool_dict(tool_obj):
                 'parameters': tool_obj.parameters
             }
         }
-    return None
+    except AttributeError:
+        return None
+
+
+# Manual tool definitions for non-FastMCP tools (Time/Date utilities)
+_TIME_TOOL_DICTS = [
+    {
+        'type': 'function',
+        'function': {
+            'name': 'get_current_time',
+            'description': 'Get the current time\n\nReturns:\n    Current time as string (HH:MM:SS)',
+            'parameters': {
+                'type': 'object',
+                'properties': {},
+                'required': []
+            }
+        }
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'get_current_date',
+            'description': 'Get the current date\n\nReturns:\n    Current date as string (YYYY-MM-DD)',
+            'parameters': {
+                'type': 'object',
+                'properties': {},
+                'required': []
+            }
+        }
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'get_current_datetime',
+            'description': 'Get the current date and time\n\nReturns:\n    Current date and time as string (YYYY-MM-DD HH:MM:SS)',
+            'parameters': {
+                'type': 'object',
+                'properties': {},
+                'required': []
+            }
+        }
+    }
+]
 
 
 def get_tool_dicts() -> list:
@@ -160,87 +251,26 @@ def get_tool_dicts() -> list:
     tools = []
     
     # Get FastMCP tools
-    if hasattr(mcp_server.mcp, '_tool_manager'):
-        tool_manager = mcp_server.mcp._tool_manager
-        if hasattr(tool_manager, '_tools'):
-            mcp_tools = tool_manager._tools
-            
-            for name, tool_obj in mcp_tools.items():
-                tool_dict = build_tool_dict(tool_obj)
-                if tool_dict:
-                    tools.append(tool_dict)
+    tool_manager = getattr(mcp_server.mcp, '_tool_manager', None)
+    mcp_tools = getattr(tool_manager, '_tools', {}) if tool_manager is not None else {}
+    
+    for tool_obj in mcp_tools.values():
+        tool_dict = build_tool_dict(tool_obj)
+        if tool_dict:
+            tools.append(tool_dict)
     
     # Add manual tool definitions for non-FastMCP tools
-    # Time/Date utilities
-    time_tools = [
-        {
-            'type': 'function',
-            'function': {
-                'name': 'get_current_time',
-                'description': 'Get the current time\n\nReturns:\n    Current time as string (HH:MM:SS)',
-                'parameters': {
-                    'type': 'object',
-                    'properties': {},
-                    'required': []
-                }
-            }
-        },
-        {
-            'type': 'function',
-            'function': {
-                'name': 'get_current_date',
-                'description': 'Get the current date\n\nReturns:\n    Current date as string (YYYY-MM-DD)',
-                'parameters': {
-                    'type': 'object',
-                    'properties': {},
-                    'required': []
-                }
-            }
-        },
-        {
-            'type': 'function',
-            'function': {
-                'name': 'get_current_datetime',
-                'description': 'Get the current date and time\n\nReturns:\n    Current date and time as string (YYYY-MM-DD HH:MM:SS)',
-                'parameters': {
-                    'type': 'object',
-                    'properties': {},
-                    'required': []
-                }
-            }
-        }
-    ]
-    tools.extend(time_tools)
+    tools.extend(_TIME_TOOL_DICTS)
     
     return tools
 
 
-# Time/Date utility functions
-def get_current_time() -> str:
-    """Get the current time
-    
-    Returns:
-        Current time as string (HH:MM:SS)
-    """
-    return datetime.now().strftime('%H:%M:%S')
-
-
-def get_current_date() -> str:
-    """Get the current date
-    
-    Returns:
-        Current date as string (YYYY-MM-DD)
-    """
-    return datetime.now().strftime('%Y-%m-%d')
-
-
-def get_current_datetime() -> str:
-    """Get the current date and time
-    
-    Returns:
-        Current date and time as string (YYYY-MM-DD HH:MM:SS)
-    """
-    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+# Time/Date utility functions by tool name
+_TIME_FUNCTIONS = {
+    'get_current_time': get_current_time,
+    'get_current_date': get_current_date,
+    'get_current_datetime': get_current_datetime,
+}
 
 
 def get_available_functions() -> Dict[str, Callable]:
@@ -259,40 +289,47 @@ def get_available_functions() -> Dict[str, Callable]:
             pass
     
     # Fallback to old method (backward compatibility)
-    return {
-        # Workspace management
-        'get_current_workspace_name': extract_function(mcp_server.get_current_workspace_name),
-        'list_all_workspaces': extract_function(mcp_server.list_all_workspaces),
-        'switch_workspace': extract_function(mcp_server.switch_workspace),
-        'create_workspace': extract_function(mcp_server.create_workspace),
-        'delete_workspace': extract_function(mcp_server.delete_workspace),
-        'rename_workspace': extract_function(mcp_server.rename_workspace),
-        
-        # Task management
-        'list_tasks': extract_function(mcp_server.list_tasks),
-        'add_task': extract_function(mcp_server.add_task),
-        'add_task_with_parent': extract_function(mcp_server.add_task_with_parent),
-        'update_task': extract_function(mcp_server.update_task),
-        'update_task_comments_from_file': extract_function(mcp_server.update_task_comments_from_file),
-        'toggle_task': extract_function(mcp_server.toggle_task),
-        'delete_task': extract_function(mcp_server.delete_task),
-        'get_task': extract_function(mcp_server.get_task),
-        'search_tasks': extract_function(mcp_server.search_tasks),
-        'search_tasks_all_workspaces': extract_function(mcp_server.search_tasks_all_workspaces),
-        'set_current_task': extract_function(mcp_server.set_current_task),
-        'clear_current_task': extract_function(mcp_server.clear_current_task),
-        'get_current_task': extract_function(mcp_server.get_current_task),
-        'move_task_as_child': extract_function(mcp_server.move_task_as_child),
-        'move_task_after': extract_function(mcp_server.move_task_after),
-        'move_task_to_root': extract_function(mcp_server.move_task_to_root),
-        'reorder_task': extract_function(mcp_server.reorder_task),
-        'find_dangling_tasks': extract_function(mcp_server.find_dangling_tasks),
-        
-        # Time/Date utilities
-        'get_current_time': get_current_time,
-        'get_current_date': get_current_date,
-        'get_current_datetime': get_current_datetime,
-    }
+    return {**_MCP_FUNCS, **_TIME_FUNCTIONS}
+
+
+def build_tool_message(content: str, tool_call_id: Optional[str] = None) -> dict:
+    """Build a tool result message for the conversation history
+    
+    OpenAI requires tool_call_id, Ollama doesn't need it but it's harmless.
+    
+    Args:
+        content: Tool output or error text
+        tool_call_id: Optional ID of the tool call this message answers
+    
+    Returns:
+        Message dictionary with role 'tool'
+    """
+    message = {'role': 'tool', 'content': content}
+    if tool_call_id:
+        message['tool_call_id'] = tool_call_id
+    return message
+
+
+def call_model(
+    provider: ModelProvider,
+    messages: list,
+    tools: Optional[list],
+    on_token: Optional[Callable[[str], None]] = None
+) -> ModelResponse:
+    """Call the provider, streaming text to on_token when possible
+    
+    Args:
+        provider: Model provider instance
+        messages: Message history list
+        tools: Provider-specific tool list (or None)
+        on_token: Optional callback receiving text deltas as they arrive
+    
+    Returns:
+        ModelResponse with the complete content and tool calls
+    """
+    if on_token and provider.supports_streaming():
+        return provider.chat_stream(messages=messages, tools=tools, on_token=on_token)
+    return provider.chat(messages=messages, tools=tools)
 
 
 def process_tool_calls(
@@ -305,7 +342,8 @@ def process_tool_calls(
     before_chat_callback: Optional[Callable[[], None]] = None,
     after_chat_callback: Optional[Callable[[], None]] = None,
     on_tool_call: Optional[Callable[[str, dict], None]] = None,
-    on_tool_call_after: Optional[Callable[[str, dict, Any], None]] = None
+    on_tool_call_after: Optional[Callable[[str, dict, Any], None]] = None,
+    on_token: Optional[Callable[[str], None]] = None
 ):
     """Process tool calling loop
     
@@ -318,22 +356,34 @@ def process_tool_calls(
         max_iterations: Maximum number of tool call iterations
         before_chat_callback: Optional callback to call before each chat request
         after_chat_callback: Optional callback to call after each chat request
+        on_token: Optional callback receiving streamed text deltas
     
     Returns:
         Tuple of (final_response, updated_messages)
     """
     iteration = 0
     
+    # Bind frequently used lookups to locals for the tool loop
+    get_function = available_functions.get
+    append_message = messages.append
+    signature = inspect.signature
+    
     while response.has_tool_calls() and iteration < max_iterations:
         iteration += 1
         
         # Add the response message containing tool calls to history (only once)
-        messages.append(response.model_dump())
+        append_message(response.model_dump())
         
         # Process all tool calls
         for tool_call in response.tool_calls:
             tool_name = tool_call.function.name
             args = tool_call.function.arguments
+            # Some providers deliver arguments as a JSON string
+            if isinstance(args, str):
+                try:
+                    args = _json_loads(args) if args else {}
+                except ValueError:
+                    args = {}
             
             # Call tool call callback if provided
             if on_tool_call:
@@ -343,15 +393,15 @@ def process_tool_calls(
                     # Don't let callback errors break tool execution
                     pass
             
-            if function_to_call := available_functions.get(tool_name):
+            if function_to_call := get_function(tool_name):
                 try:
                     # Execute function
                     # Handle parameter type conversion (FastMCP may serialize int as string)
                     converted_args = {}
+                    # Check function signature, if int type parameter, try to convert
+                    params = signature(function_to_call).parameters if args else {}
                     for key, value in args.items():
-                        # Check function signature, if int type parameter, try to convert
-                        sig = inspect.signature(function_to_call)
-                        param_type = sig.parameters.get(key)
+                        param_type = params.get(key)
                         if param_type and param_type.annotation == int:
                             converted_args[key] = int(value) if isinstance(value, str) else value
                         else:
@@ -368,14 +418,7 @@ def process_tool_calls(
                             pass
                     
                     # Add tool call result back to messages
-                    # OpenAI requires tool_call_id, Ollama doesn't need it but it's harmless
-                    tool_message = {
-                        'role': 'tool',
-                        'content': str(output),
-                    }
-                    if tool_call.id:
-                        tool_message['tool_call_id'] = tool_call.id
-                    messages.append(tool_message)
+                    append_message(build_tool_message(str(output), tool_call.id))
                 except Exception as e:
                     error_output = f'Error: {str(e)}'
                     
@@ -387,13 +430,7 @@ def process_tool_calls(
                             pass
                     
                     # Add error result back to messages
-                    tool_message = {
-                        'role': 'tool',
-                        'content': error_output,
-                    }
-                    if tool_call.id:
-                        tool_message['tool_call_id'] = tool_call.id
-                    messages.append(tool_message)
+                    append_message(build_tool_message(error_output, tool_call.id))
             else:
                 error_msg = f'Tool {tool_name} not found'
                 
@@ -405,13 +442,7 @@ def process_tool_calls(
                         pass
                 
                 # Add error result back to messages
-                tool_message = {
-                    'role': 'tool',
-                    'content': error_msg,
-                }
-                if tool_call.id:
-                    tool_message['tool_call_id'] = tool_call.id
-                messages.append(tool_message)
+                append_message(build_tool_message(error_msg, tool_call.id))
         
         # Get model's final response
         if before_chat_callback:
@@ -422,9 +453,11 @@ def process_tool_calls(
         
         try:
             # Call provider's chat method
-            response = provider.chat(
-                messages=messages,
-                tools=converted_tools if converted_tools else None,
+            response = call_model(
+                provider,
+                messages,
+                converted_tools if converted_tools else None,
+                on_token=on_token
             )
         except Exception as e:
             # If error occurs, add error message and break
@@ -440,6 +473,76 @@ def process_tool_calls(
     return response, messages
 
 
+_SYSTEM_PROMPT_INTRO = """You are a task management assistant that can help users manage tasks and workspaces."""
+
+_SYSTEM_PROMPT_RULES = """
+
+You have access to various tools for task and workspace management. The tool definitions include complete parameter information (names, types, required/optional status) - use them exactly as specified.
+
+CRITICAL RULE - Task ID Verification:
+When users refer to tasks by name or description (e.g., "Task 1", "Example task", "Project planning"), you MUST ALWAYS:
+1. First use list_tasks or search_tasks to find the actual task IDs
+2. Match the task names/descriptions to their corresponding database IDs
+3. Only then use the correct task IDs for any operation
+
+Task IDs are unique database identifiers, NOT sequential numbers or display order. 
+A task named "Task 1" may have ID 41, not ID 1. 
+A task named "Task 2" may have ID 42, not ID 2.
+The task list display order does NOT correspond to task IDs.
+
+NEVER assume task IDs based on:
+- Task names containing numbers (e.g., "Task 1" ≠ ID 1)
+- Display order in list_tasks output
+- Sequential numbering in task descriptions
+- Position in hierarchical structure
+
+ALWAYS verify task IDs by:
+- Calling list_tasks first to see the full task structure with IDs
+- Using search_tasks to find tasks by name/description
+- Matching the exact task name/description to its ID before any operation
+
+Response Guidelines:
+- When list_tasks is called, provide a concise summary of the task list. Do not add extensive operation suggestions unless the user explicitly asks for them.
+- Keep responses focused and avoid unnecessary verbosity. Only provide additional suggestions if the user asks for help or guidance.
+- When operations complete successfully, confirm briefly without repeating all available operations.
+
+Cross-Workspace Search:
+- Use search_tasks_all_workspaces(query) to search across all workspaces at once.
+- For single workspace search, use search_tasks(query).
+
+Use the appropriate tools based on user requests. All tool parameters are defined in the tool schemas - use them exactly as specified."""
+
+
+@functools.lru_cache(maxsize=None)
+def build_system_prompt(language: Optional[str] = None, no_think: bool = False) -> str:
+    """Build the system prompt
+    
+    The prompt depends only on the language and no_think flag (no per-chat or
+    time-dependent data), so every conversation with the same settings starts
+    with a byte-identical prefix that the model server can cache.
+    
+    Args:
+        language: Language code (e.g., 'zh', 'en'), or None for no language restriction
+        no_think: Whether to append the /no_think directive
+    
+    Returns:
+        System prompt text
+    """
+    system_prompt = _SYSTEM_PROMPT_INTRO
+    
+    # Add language instruction only if language is explicitly set
+    language_instruction = user_config.get_language_prompt(language)
+    if language_instruction:
+        system_prompt += f"\n\n{language_instruction}"
+    
+    system_prompt += _SYSTEM_PROMPT_RULES
+    
+    if no_think:
+        system_prompt += "\n/no_think"
+    
+    return system_prompt
+
+
 def run_agent(
     query: str,
     model: Optional[str] = None,
@@ -450,7 +553,8 @@ def run_agent(
     after_chat_callback: Optional[Callable[[], None]] = None,
     on_tool_call: Optional[Callable[[str, dict], None]] = None,
     on_tool_call_after: Optional[Callable[[str, dict, Any], None]] = None,
-    language: Optional[str] = None
+    language: Optional[str] = None,
+    on_token: Optional[Callable[[str], None]] = None
 ) -> Tuple[Optional[str], list]:
     """Run agent to process query
     
@@ -463,6 +567,7 @@ def run_agent(
         before_chat_callback: Optional callback to call before each chat request
         after_chat_callback: Optional callback to call after each chat request
         language: Language code (e.g., 'zh', 'en'). If None, defaults to None (no language restriction) or user's configured language preference.
+        on_token: Optional callback receiving text deltas as they are generated. Used only when the provider supports streaming.
     
     Returns:
         Tuple of (response_text or None, updated_message_list)
@@ -478,62 +583,12 @@ def run_agent(
     
     available_functions = get_available_functions()
     
-    # Import user_config for language support
-    import user_config
-    
     # Get language preference (default to None for no language restriction)
     if language is None:
         language = user_config.get_user_language(None)  # Get from config, or None if not set
     
-    # Build system prompt with language-specific instruction (only if language is set)
-    language_instruction = user_config.get_language_prompt(language)
-    
-    # Build base system prompt
-    system_prompt = """You are a task management assistant that can help users manage tasks and workspaces."""
-    
-    # Add language instruction only if language is explicitly set
-    if language_instruction:
-        system_prompt += f"\n\n{language_instruction}"
-    
-    system_prompt += """
-
-You have access to various tools for task and workspace management. The tool definitions include complete parameter information (names, types, required/optional status) - use them exactly as specified.
-
-CRITICAL RULE - Task ID Verification:
-When users refer to tasks by name or description (e.g., "Task 1", "Example task", "Project planning"), you MUST ALWAYS:
-1. First use list_tasks or search_tasks to find the actual task IDs
-2. Match the task names/descriptions to their corresponding database IDs
-3. Only then use the correct task IDs for any operation
-
-Task IDs are unique database identifiers, NOT sequential numbers or display order. 
-A task named "Task 1" may have ID 41, not ID 1. 
-A task named "Task 2" may have ID 42, not ID 2.
-The task list display order does NOT correspond to task IDs.
-
-NEVER assume task IDs based on:
-- Task names containing numbers (e.g., "Task 1" ≠ ID 1)
-- Display order in list_tasks output
-- Sequential numbering in task descriptions
-- Position in hierarchical structure
-
-ALWAYS verify task IDs by:
-- Calling list_tasks first to see the full task structure with IDs
-- Using search_tasks to find tasks by name/description
-- Matching the exact task name/description to its ID before any operation
-
-Response Guidelines:
-- When list_tasks is called, provide a concise summary of the task list. Do not add extensive operation suggestions unless the user explicitly asks for them.
-- Keep responses focused and avoid unnecessary verbosity. Only provide additional suggestions if the user asks for help or guidance.
-- When operations complete successfully, confirm briefly without repeating all available operations.
-
-Cross-Workspace Search:
-- Use search_tasks_all_workspaces(query) to search across all workspaces at once.
-- For single workspace search, use search_tasks(query).
-
-Use the appropriate tools based on user requests. All tool parameters are defined in the tool schemas - use them exactly as specified."""
-    
-    if no_think and provider.supports_no_think():
-        system_prompt += "\n/no_think"
+    # Identical across chats with the same settings, so the model server can reuse its prompt cache
+    system_prompt = build_system_prompt(language, no_think and provider.supports_no_think())
     
     # Build messages: if history messages provided, use them; otherwise create new conversation
     if messages is None:
@@ -560,9 +615,11 @@ Use the appropriate tools based on user requests. All tool parameters are define
     
     try:
         # Call provider's chat method
-        response = provider.chat(
-            messages=messages,
-            tools=converted_tools if converted_tools else None,
+        response = call_model(
+            provider,
+            messages,
+            converted_tools if converted_tools else None,
+            on_token=on_token
         )
     except Exception as e:
         error_msg = f"Error: Failed to call model: {str(e)}"
@@ -585,7 +642,8 @@ Use the appropriate tools based on user requests. All tool parameters are define
             before_chat_callback=before_chat_callback,
             after_chat_callback=after_chat_callback,
             on_tool_call=on_tool_call,
-            on_tool_call_after=on_tool_call_after
+            on_tool_call_after=on_tool_call_after,
+            on_token=on_token
         )
         
         # Add final response to message history
@@ -605,3 +663,40 @@ Use the appropriate tools based on user requests. All tool parameters are define
             return response_text, messages
         else:
             return None, messages
+
+
+SUMMARY_SYSTEM_PROMPT = """Summarize the following conversation between a user and a task management assistant as concise bullet points.
+Keep task IDs, task names, workspace names, and user preferences. Omit greetings and tool call details."""
+
+
+def summarize_messages(messages: list) -> Optional[str]:
+    """Summarize conversation messages with the configured model (no tools)
+    
+    Args:
+        messages: Message history slice to summarize
+    
+    Returns:
+        Summary text, or None if the model call failed
+    """
+    transcript = "\n".join(
+        f"{message.get('role')}: {message.get('content')}"
+        for message in messages
+        if message.get('content')
+    )
+    if not transcript:
+        return None
+    
+    config = load_agent_config()
+    provider = create_provider(config)
+    
+    try:
+        response = provider.chat(messages=[
+            {'role': 'system', 'content': SUMMARY_SYSTEM_PROMPT},
+            {'role': 'user', 'content': transcript},
+        ])
+    except Exception:
+        return None
+    
+    if not response.content or response.content.startswith('Error:'):
+        return None
+    return response.content
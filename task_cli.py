@@ -13,7 +13,6 @@ import sys
 import io
 import argparse
 import threading
-import time
 from typing import Optional
 
 # Set output encoding to UTF-8
@@ -40,27 +39,38 @@ class LoadingAnimation:
         self.spinning_chars = ['⠶', '⠧', '⠏', '⠛', '⠹', '⠼']
         self.running = False
         self.thread = None
+        # Set to wake the animation thread immediately on stop
+        self._stop_event = threading.Event()
     
     def _animate(self):
         """Animation loop"""
         i = 0
-        while self.running:
-            sys.stdout.write(f'\r{self.spinning_chars[i % len(self.spinning_chars)]} Thinking...')
+        frames = self.spinning_chars
+        frame_count = len(frames)
+        # Event.wait blocks without holding the GIL and returns as soon as stop() is called
+        while not self._stop_event.wait(0.1 if i else 0):
+            sys.stdout.write(f'\r{frames[i % frame_count]} Thinking...')
             sys.stdout.flush()
-            time.sleep(0.1)
             i += 1
     
     def start(self):
         """Start the animation"""
+        if self.running:
+            return
         self.running = True
+        self._stop_event.clear()
         self.thread = threading.Thread(target=self._animate, daemon=True)
         self.thread.start()
     
     def stop(self):
         """Stop the animation"""
+        if not self.running:
+            return
         self.running = False
+        self._stop_event.set()
         if self.thread:
-            self.thread.join(timeout=0.2)
+            self.thread.join()
+            self.thread = None
         sys.stdout.write('\r' + ' ' * 20 + '\r')  # Clear the line
         sys.stdout.flush()
 
@@ -88,14 +98,31 @@ def run_agent_with_ui(query: str, model: Optional[str] = None, no_think: bool =
     # Create loading animation
     loader = LoadingAnimation()
     
+    # Streaming state: whether any text has been printed, and whether the
+    # current line still holds streamed text
+    stream_state = {'streamed': False, 'line_open': False}
+    
     def before_chat():
+        # Keep streamed text from being overwritten by the spinner
+        if stream_state['line_open']:
+            sys.stdout.write('\n')
+            stream_state['line_open'] = False
         loader.start()
     
     def after_chat():
         loader.stop()
     
+    def on_token(text: str):
+        # Stop the spinner as soon as the first token arrives
+        loader.stop()
+        if not stream_state['line_open']:
+            sys.stdout.write('Assistant: ')
+            stream_state['line_open'] = True
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        stream_state['streamed'] = True
+    
     # Call shared run_agent function
-    # return_text=False means we handle output ourselves
     response_text, updated_messages = task_agent.run_agent(
         query=query,
         model=model,
@@ -104,11 +131,15 @@ def run_agent_with_ui(query: str, model: Optional[str] = None, no_think: bool =
         return_text=True,
         before_chat_callback=before_chat,
         after_chat_callback=after_chat,
-        language=language
+        language=language,
+        on_token=on_token
     )
     
-    # Print response if available
-    if response_text:
+    if stream_state['line_open']:
+        # Terminate the streamed line
+        print()
+    elif response_text and not stream_state['streamed']:
+        # Provider did not stream: print the buffered response
         print(f'Assistant: {response_text}')
     
     return updated_messages
@@ -13,14 +13,18 @@ Configuration:
 """
 
 import sys
-import io
 import os
+import atexit
 import logging
 import asyncio
-from typing import Dict, Any
+import functools
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, Tuple, Optional, Any
 
-# Set output encoding to UTF-8
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+# Set output encoding to UTF-8 (reconfigure in place rather than wrapping the stream)
+if sys.stdout.encoding and sys.stdout.encoding.lower() != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
 
 # Configure logger
 logging.basicConfig(
@@ -48,10 +52,12 @@ except ImportError:
 
 # Telegram bot library
 try:
-    from telegram import Update, InputFile
+    from telegram import Update
     from telegram.constants import ChatAction
     from telegram.error import BadRequest
-    from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+    from telegram.ext import (
+        Application, ApplicationHandlerStop, CommandHandler, MessageHandler, TypeHandler, filters, ContextTypes
+    )
 except ImportError:
     logger.error("python-telegram-bot not installed. Install it with: pip install python-telegram-bot")
     sys.exit(1)
@@ -59,7 +65,11 @@ except ImportError:
 # Import shared agent functionality
 import task_agent
 import user_config
-from task_telegram_utils import clean_markdownv2_text, dump_conversation_to_file
+from task_telegram_utils import (
+    clean_markdownv2_text, escape_markdownv2, dump_conversation_to_file, split_markdown_chunks,
+    shorten_old_tool_results, trim_conversation_history
+)
+from task_telegram_store import ResponseCache, ConversationStore, UpdateOffsetStore
 
 # Load configuration
 try:
@@ -102,7 +112,7 @@ if not _bot_token:
 _allowed_user_ids_str = os.getenv('TELEGRAM_ALLOWED_USER_IDS', '').strip()
 if _allowed_user_ids_str:
     try:
-        _allowed_user_ids = set(int(uid.strip()) for uid in _allowed_user_ids_str.split(',') if uid.strip())
+        _allowed_user_ids = frozenset(int(uid.strip()) for uid in _allowed_user_ids_str.split(',') if uid.strip())
         logger.info(f"Whitelist mode enabled. Allowed user IDs: {_allowed_user_ids}")
     except ValueError as e:
         logger.warning(f"Invalid TELEGRAM_ALLOWED_USER_IDS format: {e}. Whitelist disabled.")
@@ -111,6 +121,86 @@ else:
     _allowed_user_ids = None
     logger.info("Whitelist mode disabled. All users are allowed.")
 
+# Response cache for turns without tool calls (optional, 0 disables)
+try:
+    _response_cache_ttl = int(os.getenv('TELEGRAM_RESPONSE_CACHE_TTL', str(24 * 3600)))
+except ValueError:
+    logger.warning("Invalid TELEGRAM_RESPONSE_CACHE_TTL value. Using default (86400).")
+    _response_cache_ttl = 24 * 3600
+
+
+def _create_embed_fn():
+    """Create the embedding function for the semantic cache tier
+    
+    Enabled by setting TELEGRAM_SEMANTIC_CACHE_MODEL to an Ollama embedding model
+    (e.g. nomic-embed-text). Returns None when disabled or unavailable.
+    """
+    embed_model = os.getenv('TELEGRAM_SEMANTIC_CACHE_MODEL', '').strip()
+    if not embed_model:
+        return None
+    try:
+        from ollama import Client
+    except ImportError:
+        logger.warning("ollama not installed. Semantic response cache disabled.")
+        return None
+    
+    client = Client(host=_agent_config.get('ollama', {}).get('base_url', 'http://localhost:11434'))
+    
+    def embed(text: str) -> list:
+        return client.embeddings(model=embed_model, prompt=text)['embedding']
+    
+    logger.info(f"Semantic response cache enabled with embedding model: {embed_model}")
+    return embed
+
+
+_response_cache = (
+    ResponseCache(ttl=_response_cache_ttl, embed_fn=_create_embed_fn())
+    if _response_cache_ttl > 0 else None
+)
+
+# Dedicated thread pool for agent runs, so concurrent users queue on the model
+# backend's parallelism instead of sharing asyncio's default executor.
+# Defaults to OLLAMA_NUM_PARALLEL so every slot of a parallel Ollama server is used.
+_default_agent_workers = os.getenv('OLLAMA_NUM_PARALLEL', '').strip() or '4'
+try:
+    _agent_workers = max(1, int(os.getenv('TELEGRAM_AGENT_WORKERS', '').strip() or _default_agent_workers))
+except ValueError:
+    logger.warning("Invalid TELEGRAM_AGENT_WORKERS value. Using default (4).")
+    _agent_workers = 4
+logger.info(f"Agent worker threads: {_agent_workers}")
+_agent_pool = concurrent.futures.ThreadPoolExecutor(max_workers=_agent_workers, thread_name_prefix="agent")
+atexit.register(_agent_pool.shutdown, wait=False, cancel_futures=True)
+
+# Single thread for conversation history reads and writes (SQLite), so they stay
+# off the event loop and run in the order they were submitted
+_history_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+atexit.register(_history_pool.shutdown)
+
+# Conversation history window: once the history (after the system prompt) exceeds
+# the token estimate, older turns are summarized in the background, keeping at
+# most N recent user turns verbatim
+_HISTORY_KEEP_TURNS = 8
+_HISTORY_SUMMARY_MIN_TOKENS = 2000
+
+# Upper bound for small per-user/per-chat lookup tables; they are cleared when full
+_PER_CHAT_STATE_MAX = 4096
+
+# Language preference per user (user_id -> language code or None), so the user
+# config file is not re-read on every message; invalidated by /language
+_language_cache: Dict[int, Optional[str]] = {}
+
+
+def get_cached_user_language(user_id: int) -> Optional[str]:
+    """Get a user's language preference, reading the user config only on first use"""
+    try:
+        return _language_cache[user_id]
+    except KeyError:
+        if len(_language_cache) >= _PER_CHAT_STATE_MAX:
+            _language_cache.clear()
+        language = _language_cache[user_id] = user_config.get_user_language(user_id)
+        return language
+
+
 # Track non-whitelisted users who have been logged (to avoid spam)
 _logged_non_whitelisted_users: set[int] = set()
 
@@ -129,321 +219,351 @@ def is_user_allowed(user_id: int, user_name: str = None) -> bool:
     Returns:
         True if user is allowed, False otherwise
     """
-    if _allowed_user_ids is None:
-        return True  # No whitelist, allow all users
-    
     if user_id in _allowed_user_ids:
         return True
     
     # User is not in whitelist - log on first encounter only
     if user_id not in _logged_non_whitelisted_users:
-        if user_name:
-            username_display = f"@{user_name}"
-        else:
-            username_display = "(no username)"
+        # Mark first so racing updates from the same user do not both log
+        _logged_non_whitelisted_users.add(user_id)
+        username_display = f"@{user_name}" if user_name else "(no username)"
         logger.warning(
-            f"Non-whitelisted user attempted to access bot - "
-            f"User ID: {user_id}, Username: {username_display} "
-            f"(Consider adding to TELEGRAM_ALLOWED_USER_IDS)"
+            "Non-whitelisted user attempted to access bot - "
+            "User ID: %s, Username: %s "
+            "(Consider adding to TELEGRAM_ALLOWED_USER_IDS)",
+            user_id, username_display
         )
-        _logged_non_whitelisted_users.add(user_id)
     
     return False
 
 
-# Store conversation history per user (chat_id -> messages)
-user_conversations: Dict[int, list] = {}
+def _allow_all_users(user_id: int, user_name: str = None) -> bool:
+    """is_user_allowed when no whitelist is configured"""
+    return True
 
 
-def run_agent_for_telegram(query: str, model: str = None, no_think: bool = False, messages: list = None, 
-                           tool_call_notifications: list = None, async_notify_callback = None, event_loop = None,
-                           user_id: int = None, bot = None, chat_id: int = None):
-    """Run agent for Telegram bot
+# No whitelist: resolve the check once at import time instead of on every request
+if _allowed_user_ids is None:
+    is_user_allowed = _allow_all_users
+
+
+# Store conversation history per chat (chat_id -> messages), persisted across restarts.
+# Only the most recently used conversations are kept in memory.
+try:
+    _conversation_cache_size = max(1, int(os.getenv('TELEGRAM_CONVERSATION_CACHE_SIZE', '256')))
+except ValueError:
+    logger.warning("Invalid TELEGRAM_CONVERSATION_CACHE_SIZE value. Using default (256).")
+    _conversation_cache_size = 256
+user_conversations = ConversationStore(maxsize=_conversation_cache_size)
+
+# Last processed update ID per bot, persisted so updates redelivered after a restart are skipped
+_update_offset = UpdateOffsetStore()
+
+
+def _estimate_tokens(messages: list) -> int:
+    """Rough token count of messages (characters / 4)"""
+    return len(str(messages)) // 4
+
+
+def compact_conversation_history(messages: list, keep_turns: int = _HISTORY_KEEP_TURNS,
+                                 min_tokens: int = _HISTORY_SUMMARY_MIN_TOKENS) -> list:
+    """Summarize older turns of a conversation into a single system message
     
-    This is a wrapper around task_agent.run_agent. The response will be automatically
-    converted to Telegram MarkdownV2 format using telegramify-markdown library.
+    The system prompt and the most recent user turns (with their tool calls and
+    replies) are kept verbatim. Everything in between, including an earlier
+    summary, is replaced by a model-generated summary. Recent turns are only
+    kept while they fit in half of min_tokens, so the result stays well below
+    the threshold and is not summarized again on the next turn. Short
+    conversations are returned unchanged.
+    
+    Calls the model, so run it outside the event loop.
     
     Args:
-        query: User query
-        model: Model to use (defaults to config file value)
-        no_think: Whether to disable thinking mode
-        messages: Optional conversation history message list
-        tool_call_notifications: Optional list to store tool call notifications (tool_name, args, result, is_before)
-        async_notify_callback: Optional async callback function to immediately notify user (update, notification_text)
-        event_loop: Optional event loop for async operations
-        user_id: Telegram user ID for language preference lookup
+        messages: Conversation history (system prompt first)
+        keep_turns: Maximum number of recent user turns to keep verbatim
+        min_tokens: Rough token estimate (chars / 4, system prompt excluded)
+                    below which nothing is summarized
     
     Returns:
-        Tuple of (response_text, updated_message_list)
+        Compacted message list (or the original list if no compaction was needed)
     """
-    # Define batch tools that should be grouped together
-    BATCH_TOOLS = {
-        'add_task', 'add_task_with_parent', 'update_task', 
-        'delete_task', 'toggle_task'
-    }
-    
-    # Track batch operations
-    batch_state = {
-        'current_tool': None,
-        'count': 0,
-        'results': [],
-        'started': False,
-        'message_future': None  # Future for batch start message, to edit it when batch completes
-    }
-    
-    # Track message futures for editing (tool_name -> future)
-    tool_message_futures = {}
-    
-    def send_batch_notification():
-        """Send notification for completed batch operation"""
-        if batch_state['current_tool'] and batch_state['count'] > 0:
-            tool_name = batch_state['current_tool']
-            tool_display = tool_name.replace('_', ' ').title()
-            count = batch_state['count']
-            
-            # Create summary notification with blockquote format
-            notification_text = f"✅ Completed:\n> {tool_display} ({count} calls)"
-            
-            # Add summary of results (limit to first 3 for readability and to avoid message length issues)
-            if batch_state['results']:
-                summary_lines = []
-                max_results_to_show = 3
-                max_result_length = 80
-                
-                for i, result in enumerate(batch_state['results'][:max_results_to_show]):
-                    result_str = str(result)
-                    if len(result_str) > max_result_length:
-                        result_str = result_str[:max_result_length] + "..."
-                    summary_lines.append(f"• {result_str}")
-                
-                if count > max_results_to_show:
-                    summary_lines.append(f"... and {count - max_results_to_show} more")
-                
-                summary_text = "\n".join(summary_lines)
-                # Ensure total message doesn't exceed Telegram's limit (4096 chars)
-                # Reserve some space for the header and formatting
-                max_summary_length = 3500
-                if len(notification_text) + len(summary_text) + 10 > max_summary_length:
-                    # Truncate summary if needed
-                    available_length = max_summary_length - len(notification_text) - 20
-                    if available_length > 0:
-                        summary_text = summary_text[:available_length] + "..."
-                    else:
-                        summary_text = ""
-                
-                if summary_text:
-                    notification_text += "\n" + summary_text
-            
-            # Edit the original batch start message instead of sending a new one
-            if batch_state['message_future'] and bot and chat_id:
-                future = batch_state['message_future']
-                try:
-                    # Get message ID from future (with timeout)
-                    message_id = future.result(timeout=10)
-                    if message_id and event_loop:
-                        # Edit the message
-                        asyncio.run_coroutine_threadsafe(
-                            safe_edit_message_text(bot, chat_id, message_id, notification_text),
-                            event_loop
-                        )
-                    else:
-                        # If we couldn't get message ID, fallback to send new message
-                        if async_notify_callback and event_loop:
-                            asyncio.run_coroutine_threadsafe(
-                                async_notify_callback(notification_text),
-                                event_loop
-                            )
-                except Exception as e:
-                    logger.warning(f"Failed to edit batch notification: {e}")
-                    # Fallback: send new message if edit fails
-                    if async_notify_callback and event_loop:
-                        try:
-                            asyncio.run_coroutine_threadsafe(
-                                async_notify_callback(notification_text),
-                                event_loop
-                            )
-                        except Exception as e2:
-                            logger.warning(f"Failed to send fallback batch notification: {e2}")
-            elif async_notify_callback and event_loop:
-                # Fallback: send new message if we don't have message future
-                try:
-                    asyncio.run_coroutine_threadsafe(
-                        async_notify_callback(notification_text),
-                        event_loop
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to send batch notification: {e}")
-            
-            # Store in notifications list
-            if tool_call_notifications is not None:
-                tool_call_notifications.append(('batch_after', tool_name, None, batch_state['results']))
+    if not messages:
+        return messages
+    start = 1 if messages[0].get('role') == 'system' else 0
+    if _estimate_tokens(messages[start:]) < min_tokens:
+        return messages
+    
+    # Find the start of the oldest turn to keep, so tool calls stay with their results
+    user_indices = [i for i, m in enumerate(messages) if m.get('role') == 'user']
+    if not user_indices:
+        return messages
+    cut = user_indices[-1]
+    budget = min_tokens // 2
+    for index in reversed(user_indices[-keep_turns:-1]):
+        if _estimate_tokens(messages[index:]) > budget:
+            break
+        cut = index
+    
+    older = messages[start:cut]
+    if not older:
+        return messages
+    
+    summary = task_agent.summarize_messages(older)
+    if not summary:
+        return messages
+    
+    logger.info("Summarized %d older messages into conversation summary", len(older))
+    summary_message = {'role': 'system', 'content': f"Summary of earlier conversation:\n{summary}"}
+    return messages[:start] + [summary_message] + messages[cut:]
+
+
+# Tools that never get a status notification (comma-separated tool names)
+_SILENT_TOOLS = frozenset(
+    name.strip()
+    for name in os.getenv(
+        'TELEGRAM_SILENT_TOOLS', 'get_current_time,get_current_date,get_current_datetime'
+    ).split(',')
+    if name.strip()
+)
+
+# Whether tools called without arguments get a status notification
+_NOTIFY_EMPTY_TOOLS = os.getenv('TELEGRAM_NOTIFY_EMPTY_TOOLS', '1').strip().lower() not in ('0', 'false', 'no')
+
+# Display names for tool notifications ("add_task" -> "Add Task"), computed once
+_TOOL_DISPLAY = {
+    tool_name: tool_name.replace('_', ' ').title()
+    for tool_name in task_agent.get_available_functions()
+}
+
+
+def _tool_display(tool_name: str) -> str:
+    """Get the display name of a tool"""
+    tool_display = _TOOL_DISPLAY.get(tool_name)
+    if tool_display is None:
+        tool_display = _TOOL_DISPLAY[tool_name] = tool_name.replace('_', ' ').title()
+    return tool_display
+
+
+# Tool status notification templates (blockquote lines render as MarkdownV2 quotes)
+_TPL_CALL_TOOL = "🔧 Calling tool:\n> {display}{args}"
+_TPL_COMPLETE = "✅ Tool execution completed:\n> {display}{args}"
+_TPL_BATCH_START = "🔧 Starting batch:\n> {display}..."
+_TPL_BATCH_PROGRESS = "⏳ Running batch:\n> {display} ({done} done)"
+_TPL_BATCH_DONE = "✅ Completed:\n> {display} ({count} calls)"
+
+
+def _truncate(value: Any, max_length: int) -> str:
+    """Convert a value to text, cutting it to max_length characters plus "..." """
+    text = str(value)
+    return text if len(text) <= max_length else text[:max_length] + "..."
+
+
+def _format_tool_args(args: dict) -> str:
+    """Format tool arguments as blockquote lines, truncating long values"""
+    if not args:
+        return ""
+    return "\n\nArguments:\n" + "\n".join(
+        f"> {key}: {_truncate(value, 50)}" for key, value in args.items()
+    )
+
+
+# Tools whose consecutive calls are grouped into one batch notification
+_BATCH_TOOLS = frozenset({
+    'add_task', 'add_task_with_parent', 'update_task',
+    'delete_task', 'toggle_task'
+})
+
+# Batch progress is shown every N completed calls
+_BATCH_PROGRESS_EVERY = 5
+
+
+class _ToolNotifier:
+    """Tool call callbacks for one agent turn
+    
+    before() and after() are passed to task_agent.run_agent and run in the agent
+    thread. They log each call and set entries of the turn's status message
+    through notify_callback, scheduled on the event loop without waiting.
+    """
+    
+    def __init__(self, notify_callback=None, event_loop=None):
+        """Initialize tool notifier
+        
+        Args:
+            notify_callback: Optional callback (entry_key, notification_text) that sets
+                             one entry of the tool progress status message
+            event_loop: Event loop the callback is scheduled on
+        """
+        self.notify_callback = notify_callback
+        self.event_loop = event_loop
+        # Whether any tool was called during this turn (such turns are never cached)
+        self.called = False
+        self._seq = 0
+        # Status entry of the non-batch tool currently running
+        self._entry_key = None
+        # Running batch
+        self._batch_tool = None
+        self._batch_count = 0
+        self._batch_results = []
+        self._batch_entry_key = None
+        self._batch_progress_count = 0  # Call count shown by the last progress update
+    
+    def _notify(self, entry_key: str, notification_text: str):
+        """Set a status entry from the agent thread without waiting for Telegram"""
+        if self.notify_callback and self.event_loop:
+            try:
+                # Plain callback instead of a coroutine: no Task or cross-thread Future per tool
+                self.event_loop.call_soon_threadsafe(self.notify_callback, entry_key, notification_text)
+            except Exception as e:
+                logger.warning("Failed to schedule tool call notification: %s", e)
+    
+    def _next_entry_key(self) -> str:
+        self._seq += 1
+        return f"tool-{self._seq}"
+    
+    def flush(self):
+        """Update the batch status entry with the completed batch summary"""
+        if not self._batch_tool or self._batch_count == 0:
+            return
+        
+        count = self._batch_count
+        
+        # Create summary notification with blockquote format
+        notification_text = _TPL_BATCH_DONE.format(display=_tool_display(self._batch_tool), count=count)
+        
+        # Add summary of results (limit to first 3 for readability and to avoid message length issues)
+        if self._batch_results:
+            max_results_to_show = 3
+            max_result_length = 80
+            summary_lines = [
+                f"• {_truncate(result, max_result_length)}"
+                for result in self._batch_results[:max_results_to_show]
+            ]
+            if count > max_results_to_show:
+                summary_lines.append(f"... and {count - max_results_to_show} more")
             
-            # Reset batch state
-            batch_state['current_tool'] = None
-            batch_state['count'] = 0
-            batch_state['results'] = []
-            batch_state['started'] = False
-            batch_state['message_future'] = None
-    
-    # Create tool call callback (before execution) to log and notify immediately
-    def on_tool_call(tool_name: str, args: dict):
+            # At most max_results_to_show lines of max_result_length characters, so the
+            # summary always fits well within Telegram's 4096 character limit
+            notification_text += "\n" + "\n".join(summary_lines)
+        
+        self._notify(self._batch_entry_key or self._next_entry_key(), notification_text)
+        
+        # Reset batch state
+        self._batch_tool = None
+        self._batch_count = 0
+        self._batch_results = []
+        self._batch_entry_key = None
+        self._batch_progress_count = 0
+    
+    def before(self, tool_name: str, args: dict):
         """Callback before a tool is called"""
-        # Log to console
-        logger.info(f"Tool calling (before): {tool_name} with args: {args}")
+        self.called = True
         
-        # Check if this is a batch tool
-        is_batch_tool = tool_name in BATCH_TOOLS
+        # Log to console
+        logger.info("Tool calling (before): %s with args: %s", tool_name, args)
         
         # If this is a different tool than current batch, send previous batch notification
-        if batch_state['current_tool'] and batch_state['current_tool'] != tool_name:
-            send_batch_notification()
+        if self._batch_tool and self._batch_tool != tool_name:
+            self.flush()
         
-        # Handle batch tools
-        if is_batch_tool:
+        if tool_name in _BATCH_TOOLS:
             # Start or continue batch
-            if not batch_state['started']:
-                batch_state['current_tool'] = tool_name
-                batch_state['started'] = True
-                batch_state['count'] = 0
-                batch_state['results'] = []
-                
-                # Send batch start notification and save future for later editing
-                tool_display = tool_name.replace('_', ' ').title()
-                notification_text = f"🔧 Starting batch:\n> {tool_display}..."
-                
-                if async_notify_callback and event_loop:
-                    try:
-                        # Send notification and store future for later message ID retrieval
-                        future = asyncio.run_coroutine_threadsafe(
-                            async_notify_callback(notification_text),
-                            event_loop
-                        )
-                        # Store future for later editing when batch completes
-                        batch_state['message_future'] = future
-                    except Exception as e:
-                        logger.warning(f"Failed to send batch start notification: {e}")
-            
-            batch_state['count'] += 1
-        else:
-            # Non-batch tool: send previous batch notification if any
-            if batch_state['current_tool']:
-                send_batch_notification()
-            
-            # Send individual notification for non-batch tools
-            tool_display = tool_name.replace('_', ' ').title()
-            
-            # Format arguments, each on separate line with blockquote
-            args_lines = []
-            if args:
-                for key, value in args.items():
-                    value_str = str(value)
-                    if len(value_str) > 50:
-                        value_str = value_str[:50] + "..."
-                    args_lines.append(f"> {key}: {value_str}")
-            
-            # Build notification with MarkdownV2 format using blockquote
-            # Tool name and arguments each on separate line with blockquote prefix
-            notification_text = f"🔧 Calling tool:\n> {tool_display}"
-            if args_lines:
-                notification_text += "\n\nArguments:\n" + "\n".join(args_lines)
-            
-            # Immediately notify user if async callback is provided
-            if async_notify_callback and event_loop:
-                try:
-                    # Send notification and store future for later message ID retrieval
-                    future = asyncio.run_coroutine_threadsafe(
-                        async_notify_callback(notification_text),
-                        event_loop
-                    )
-                    # Store future for later editing
-                    tool_message_futures[tool_name] = future
-                except Exception as e:
-                    logger.warning(f"Failed to schedule tool call notification: {e}")
-            
-            # Store notification for async handling (for after notifications)
-            if tool_call_notifications is not None:
-                tool_call_notifications.append(('before', tool_name, args, None))
+            if self._batch_tool is None:
+                self._batch_tool = tool_name
+                self._batch_entry_key = self._next_entry_key()
+                self._notify(self._batch_entry_key, _TPL_BATCH_START.format(display=_tool_display(tool_name)))
+            self._batch_count += 1
+            return
+        
+        # Skip notifications that carry no useful information
+        if tool_name in _SILENT_TOOLS or (not args and not _NOTIFY_EMPTY_TOOLS):
+            self._entry_key = None
+            return
+        
+        # Tool name and arguments each on separate line with blockquote prefix
+        self._entry_key = self._next_entry_key()
+        self._notify(
+            self._entry_key,
+            _TPL_CALL_TOOL.format(display=_tool_display(tool_name), args=_format_tool_args(args))
+        )
     
-    # Create tool call callback (after execution) to log and notify
-    def on_tool_call_after(tool_name: str, args: dict, result: Any):
-        """Callback after a tool is called - changes 'Calling' message to 'completed'"""
+    def after(self, tool_name: str, args: dict, result: Any):
+        """Callback after a tool is called - changes 'Calling' entry to 'completed'"""
         # Log to console
-        logger.info(f"Tool called (after): {tool_name} with args: {args}, result: {result}")
-        
-        # Check if this is a batch tool
-        is_batch_tool = tool_name in BATCH_TOOLS
+        if logger.isEnabledFor(logging.INFO):
+            # Results can be large (e.g. a full task list); log only the beginning
+            logger.info("Tool called (after): %s with args: %s, result: %s", tool_name, args, _truncate(result, 500))
         
-        if is_batch_tool:
+        if tool_name in _BATCH_TOOLS:
             # Accumulate result for batch
-            if batch_state['current_tool'] == tool_name:
-                batch_state['results'].append(result)
-        else:
-            # Non-batch tool: send completion notification with same format as calling notification
-            # Only change "Calling tool" to "Tool execution completed"
-            tool_display = tool_name.replace('_', ' ').title()
-            
-            # Format arguments, each on separate line with blockquote (same as on_tool_call)
-            args_lines = []
-            if args:
-                for key, value in args.items():
-                    value_str = str(value)
-                    if len(value_str) > 50:
-                        value_str = value_str[:50] + "..."
-                    args_lines.append(f"> {key}: {value_str}")
-            
-            # Build notification with same format as on_tool_call, just change prefix
-            notification_text = f"✅ Tool execution completed:\n> {tool_display}"
-            if args_lines:
-                notification_text += "\n\nArguments:\n" + "\n".join(args_lines)
-            
-            # Edit the original message instead of sending a new one
-            if tool_name in tool_message_futures and bot and chat_id:
-                future = tool_message_futures[tool_name]
-                try:
-                    # Get message ID from future (with timeout)
-                    message_id = future.result(timeout=10)
-                    if message_id and event_loop:
-                        # Edit the message
-                        asyncio.run_coroutine_threadsafe(
-                            safe_edit_message_text(bot, chat_id, message_id, notification_text),
-                            event_loop
-                        )
-                        # Remove future after editing
-                        del tool_message_futures[tool_name]
-                    else:
-                        # If we couldn't get message ID, fall through to send new message
-                        if tool_name in tool_message_futures:
-                            del tool_message_futures[tool_name]
-                except Exception as e:
-                    logger.warning(f"Failed to edit tool call notification: {e}")
-                    # Remove future on error
-                    if tool_name in tool_message_futures:
-                        del tool_message_futures[tool_name]
-                    # Fallback: send new message if edit fails
-                    if async_notify_callback and event_loop:
-                        try:
-                            asyncio.run_coroutine_threadsafe(
-                                async_notify_callback(notification_text),
-                                event_loop
-                            )
-                        except Exception as e2:
-                            logger.warning(f"Failed to send fallback notification: {e2}")
-            elif async_notify_callback and event_loop:
-                # Fallback: send new message if we don't have message future
-                try:
-                    asyncio.run_coroutine_threadsafe(
-                        async_notify_callback(notification_text),
-                        event_loop
+            if self._batch_tool == tool_name:
+                self._batch_results.append(result)
+                
+                # Update the same status entry with a running count
+                done = len(self._batch_results)
+                if done - self._batch_progress_count >= _BATCH_PROGRESS_EVERY:
+                    self._batch_progress_count = done
+                    self._notify(
+                        self._batch_entry_key,
+                        _TPL_BATCH_PROGRESS.format(display=_tool_display(tool_name), done=done)
                     )
-                except Exception as e:
-                    logger.warning(f"Failed to send tool call after notification: {e}")
-            
-            # Note: We don't add non-batch tool notifications to tool_call_notifications
-            # because they are sent immediately via async_notify_callback above.
-            # This prevents duplicate notifications in handle_message
+        elif self._entry_key:
+            # Same format as the calling entry, only the prefix changes
+            self._notify(
+                self._entry_key,
+                _TPL_COMPLETE.format(display=_tool_display(tool_name), args=_format_tool_args(args))
+            )
+            self._entry_key = None
+
+
+def run_agent_for_telegram(query: str, model: str = None, no_think: bool = False, messages: list = None, 
+                           notify_callback = None, event_loop = None, user_id: int = None,
+                           on_token = None, before_chat_callback = None):
+    """Run agent for Telegram bot
+    
+    This is a wrapper around task_agent.run_agent. The response will be automatically
+    converted to Telegram MarkdownV2 format using telegramify-markdown library.
+    
+    Args:
+        query: User query
+        model: Model to use (defaults to config file value)
+        no_think: Whether to disable thinking mode
+        messages: Optional conversation history message list
+        notify_callback: Optional callback (entry_key, notification_text) that sets one entry
+                         of the tool progress status message; scheduled on event_loop
+        event_loop: Optional event loop for async operations
+        user_id: Telegram user ID for language preference lookup
+        on_token: Optional callback receiving streamed text deltas (called from the agent thread)
+        before_chat_callback: Optional callback called before each model request
+    
+    Returns:
+        Tuple of (response_text, updated_message_list)
+    """
+    # Tool call callbacks feeding the status message
+    notifier = _ToolNotifier(notify_callback, event_loop)
     
     # Get user's language preference (None if not set, meaning no language restriction)
-    language = user_config.get_user_language(user_id) if user_id is not None else None
+    language = get_cached_user_language(user_id) if user_id is not None else None
+    
+    # Identical (or paraphrased) input against identical conversation state:
+    # reuse the cached answer
+    cache_key = None
+    prefix_key = None
+    if _response_cache is not None:
+        cache_key = ResponseCache.make_key(model, no_think, language, messages, query)
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Response cache hit")
+            return cached
+        if _response_cache.embed_fn is not None:
+            prefix_key = ResponseCache.make_prefix_key(model, no_think, language, messages)
+            try:
+                cached = _response_cache.get_similar(prefix_key, query)
+            except Exception as e:
+                logger.warning("Semantic cache lookup failed: %s", e)
+                cached = None
+            if cached is not None:
+                logger.info("Semantic response cache hit")
+                return cached
     
     # Call the shared run_agent function
     # No need to add MarkdownV2 format requirements to prompt since telegramify-markdown
@@ -454,18 +574,95 @@ def run_agent_for_telegram(query: str, model: str = None, no_think: bool = False
         no_think=no_think,
         messages=messages,
         return_text=True,
-        on_tool_call=on_tool_call,
-        on_tool_call_after=on_tool_call_after,
-        language=language
+        before_chat_callback=before_chat_callback,
+        on_tool_call=notifier.before,
+        on_tool_call_after=notifier.after,
+        language=language,
+        on_token=on_token
     )
     
     # Send any remaining batch notification before returning
-    if batch_state['current_tool']:
-        send_batch_notification()
+    notifier.flush()
+    
+    # Bound the history sent to the model on later turns (older turns are
+    # summarized in the background once the reply was sent)
+    updated_messages = trim_conversation_history(shorten_old_tool_results(updated_messages))
+    
+    # Only cache pure conversational turns; tool calls have side effects
+    if (cache_key is not None and not notifier.called
+            and response_text and not response_text.startswith('Error')):
+        try:
+            _response_cache.set(cache_key, response_text, updated_messages)
+            if prefix_key is not None:
+                _response_cache.set_similar(prefix_key, query, response_text, updated_messages)
+        except Exception as e:
+            logger.warning("Failed to store cached response: %s", e)
     
     return response_text, updated_messages
 
 
+# Fixed replies
+_UNAUTHORIZED_MESSAGE = "Sorry, you are not authorized to use this bot."
+_CLEARED_MESSAGE = "Conversation history cleared."
+
+_WELCOME_MESSAGE = """Welcome to TaskMCP Bot!
+
+I can help you manage tasks and workspaces using natural language.
+
+Commands:
+/start - Show this welcome message
+/clear - Clear conversation history
+/help - Show help information
+/dump - Export conversation history as JSON for debugging
+
+Just send me a message and I'll help you manage your tasks!"""
+
+_HELP_TEXT = """TaskMCP Bot Help
+
+I can help you:
+- List, add, update, delete tasks
+- Manage workspaces
+- Search tasks
+- Get current time/date
+
+Examples:
+- "List all tasks"
+- "Add a task: Complete project documentation"
+- "What is the current workspace?"
+- "Mark task #1 as done"
+
+Use /clear to reset conversation history.
+Use /dump to export conversation history as JSON for debugging.
+Use /language to set your language preference."""
+
+# Fixed replies are plain text: escape them once instead of running the Markdown converter
+_PRE_ESCAPED = {
+    text: escape_markdownv2(text)
+    for text in (_UNAUTHORIZED_MESSAGE, _CLEARED_MESSAGE, _WELCOME_MESSAGE, _HELP_TEXT)
+}
+
+
+# Texts at least this long are converted to MarkdownV2 in a worker thread
+_MARKDOWN_OFFLOAD_MIN_CHARS = 1000
+
+
+async def convert_to_markdownv2(text: str) -> str:
+    """Convert text to MarkdownV2 without blocking the event loop on long texts
+    
+    Short texts (tool notifications, fixed replies) are converted inline, where
+    a thread hop would cost more than the conversion itself.
+    """
+    if len(text) < _MARKDOWN_OFFLOAD_MIN_CHARS:
+        return clean_markdownv2_text(text)
+    return await asyncio.to_thread(clean_markdownv2_text, text)
+
+
+def _is_parse_error(error: BadRequest) -> bool:
+    """Check whether a BadRequest was caused by MarkdownV2 entity parsing"""
+    err_msg = getattr(error, 'message', None) or str(error)
+    return err_msg.startswith("Can't parse entities") or "parse" in err_msg.lower()
+
+
 async def safe_reply_text(update: Update, text: str, parse_mode: str = "MarkdownV2"):
     """Safely reply with text, falling back to plain text if MarkdownV2 parsing fails
     
@@ -481,15 +678,15 @@ async def safe_reply_text(update: Update, text: str, parse_mode: str = "Markdown
         Message object from Telegram API
     """
     # Convert text to MarkdownV2 format using telegramify-markdown
-    cleaned_text = clean_markdownv2_text(text)
+    cleaned_text = _PRE_ESCAPED.get(text) or await convert_to_markdownv2(text)
     
     try:
         message = await update.message.reply_text(cleaned_text, parse_mode=parse_mode)
         return message
     except BadRequest as e:
         # If MarkdownV2 parsing fails, fall back to plain text
-        if "Can't parse entities" in str(e) or "parse" in str(e).lower():
-            logger.warning(f"MarkdownV2 parsing failed, falling back to plain text: {e}")
+        if _is_parse_error(e):
+            logger.warning("MarkdownV2 parsing failed, falling back to plain text: %s", e)
             message = await update.message.reply_text(cleaned_text)
             return message
         else:
@@ -497,9 +694,38 @@ async def safe_reply_text(update: Update, text: str, parse_mode: str = "Markdown
             raise
 
 
+async def reply_chunks(update: Update, chunks):
+    """Reply with several texts in order
+    
+    Sends are kept sequential so the chunks of one answer arrive in order, but all
+    chunks are converted to MarkdownV2 up front, so each conversion overlaps the
+    sends before it. Conversions are memoized, so safe_reply_text reuses them.
+    
+    Args:
+        update: Telegram update object
+        chunks: Texts to send (can be any Markdown format)
+    """
+    chunks = list(chunks)
+    conversions = [asyncio.ensure_future(convert_to_markdownv2(chunk)) for chunk in chunks]
+    try:
+        for chunk, conversion in zip(chunks, conversions):
+            await conversion
+            await safe_reply_text(update, chunk)
+    finally:
+        for conversion in conversions:
+            conversion.cancel()
+
+
+# Last text set on each edited message ((chat_id, message_id) -> text), to skip no-op edits
+_last_edit_text: Dict[Tuple[int, int], str] = {}
+
+
 async def safe_edit_message_text(bot, chat_id: int, message_id: int, text: str, parse_mode: str = "MarkdownV2"):
     """Safely edit a message, falling back to plain text if MarkdownV2 parsing fails
     
+    Edits that would not change the message are skipped, since Telegram
+    rejects them anyway ("message is not modified").
+    
     Args:
         bot: Telegram bot instance
         chat_id: Chat ID where the message is located
@@ -508,7 +734,11 @@ async def safe_edit_message_text(bot, chat_id: int, message_id: int, text: str,
         parse_mode: Parse mode to use (default: MarkdownV2)
     """
     # Convert text to MarkdownV2 format using telegramify-markdown
-    cleaned_text = clean_markdownv2_text(text)
+    cleaned_text = await convert_to_markdownv2(text)
+    
+    message_key = (chat_id, message_id)
+    if _last_edit_text.get(message_key) == cleaned_text:
+        return
     
     try:
         await bot.edit_message_text(
@@ -519,8 +749,8 @@ async def safe_edit_message_text(bot, chat_id: int, message_id: int, text: str,
         )
     except BadRequest as e:
         # If MarkdownV2 parsing fails, fall back to plain text
-        if "Can't parse entities" in str(e) or "parse" in str(e).lower():
-            logger.warning(f"MarkdownV2 parsing failed, falling back to plain text: {e}")
+        if _is_parse_error(e):
+            logger.warning("MarkdownV2 parsing failed, falling back to plain text: %s", e)
             await bot.edit_message_text(
                 chat_id=chat_id,
                 message_id=message_id,
@@ -529,92 +759,289 @@ async def safe_edit_message_text(bot, chat_id: int, message_id: int, text: str,
         else:
             # Re-raise if it's a different BadRequest error
             raise
+    
+    if len(_last_edit_text) >= _PER_CHAT_STATE_MAX:
+        _last_edit_text.clear()
+    _last_edit_text[message_key] = cleaned_text
 
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /start command"""
-    user_id = update.effective_user.id
-    username = update.effective_user.username
+# Event loop time of the last status/streaming request per chat. Shared by all
+# progress messages of a chat, so concurrent turns in one chat are throttled together
+_chat_last_request: Dict[int, float] = {}
+
+
+def _chat_request_delay(chat_id: int, min_interval: float) -> float:
+    """Seconds to wait before the next progress request to a chat"""
+    last_request = _chat_last_request.get(chat_id, 0.0)
+    return max(0.0, last_request + min_interval - asyncio.get_running_loop().time())
+
+
+def _record_chat_request(chat_id: int):
+    """Record a progress request to a chat for throttling"""
+    if len(_chat_last_request) >= _PER_CHAT_STATE_MAX and chat_id not in _chat_last_request:
+        _chat_last_request.clear()
+    _chat_last_request[chat_id] = asyncio.get_running_loop().time()
+
+
+class ToolStatusMessage:
+    """Single Telegram message that shows tool progress for one agent turn
     
-    # Check whitelist
-    if not is_user_allowed(user_id, username):
-        await safe_reply_text(update, "Sorry, you are not authorized to use this bot.")
-        return
+    Entries (one per tool call or batch) are set by key and rendered into one
+    message, which is sent on the first entry and then edited in place. Edits
+    are debounced so that a burst of tool calls produces at most one request
+    per min_interval, instead of separate messages per tool.
+    """
     
-    welcome_message = """Welcome to TaskMCP Bot!
+    def __init__(self, update: Update, bot, chat_id: int, min_interval: float = 0.5):
+        """Initialize status message
+        
+        Args:
+            update: Telegram update to reply to
+            bot: Telegram bot instance used for edits
+            chat_id: Chat ID where the message is sent
+            min_interval: Minimum seconds between two progress requests to the chat
+        """
+        self.update = update
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self._entries: Dict[str, str] = {}
+        self._message_id = None
+        self._sent_text = None
+        self._handle = None
+        self._task = None
+        self._lock = asyncio.Lock()
+    
+    def _render(self) -> str:
+        """Join entries into the message text, dropping the oldest ones if too long"""
+        entries = list(self._entries.values())
+        text = "\n\n".join(entries)
+        # Leave headroom for MarkdownV2 escaping below Telegram's 4096 char limit
+        while len(text) > 3500 and len(entries) > 1:
+            entries.pop(0)
+            text = "...\n\n" + "\n\n".join(entries)
+        return text
+    
+    def set_entry(self, entry_key: str, text: str):
+        """Set (add or replace) a progress entry and schedule a debounced update (event loop only)"""
+        self._entries[entry_key] = text
+        if self._handle is None:
+            delay = _chat_request_delay(self.chat_id, self.min_interval)
+            self._handle = asyncio.get_running_loop().call_later(delay, self._start_flush)
+    
+    def _start_flush(self):
+        self._task = asyncio.get_running_loop().create_task(self._flush())
+    
+    async def _flush(self):
+        """Send or edit the status message with the current entries"""
+        self._handle = None
+        async with self._lock:
+            text = self._render()
+            if not text or text == self._sent_text:
+                return
+            try:
+                if self._message_id is None:
+                    message = await safe_reply_text(self.update, text)
+                    self._message_id = message.message_id if message else None
+                else:
+                    await safe_edit_message_text(self.bot, self.chat_id, self._message_id, text)
+                self._sent_text = text
+            except Exception as e:
+                logger.warning("Failed to update tool status message: %s", e)
+            _record_chat_request(self.chat_id)
+    
+    async def finish(self):
+        """Flush pending entries immediately (call before sending the final answer)"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._entries:
+            await self._flush()
 
-I can help you manage tasks and workspaces using natural language.
 
-Commands:
-/start - Show this welcome message
-/clear - Clear conversation history
-/help - Show help information
-/dump - Export conversation history as JSON for debugging
+# Streaming reply thresholds: characters before the first message is sent, and
+# minimum seconds between edits
+try:
+    _stream_min_chars = max(1, int(os.getenv('TELEGRAM_STREAM_MIN_CHARS', '120')))
+    _stream_interval = max(0.5, float(os.getenv('TELEGRAM_STREAM_INTERVAL', '1.0')))
+except ValueError:
+    logger.warning("Invalid TELEGRAM_STREAM_MIN_CHARS or TELEGRAM_STREAM_INTERVAL value. Using defaults (120, 1.0).")
+    _stream_min_chars = 120
+    _stream_interval = 1.0
 
-Just send me a message and I'll help you manage your tasks!"""
+
+class StreamingReply:
+    """Telegram message that shows the model's reply while it is being generated
+    
+    Text deltas are appended on the event loop; once min_chars have arrived the
+    text is sent as a plain message and then edited in place at most once per
+    min_interval (Telegram allows roughly one edit per second per message).
+    finish() replaces the partial text with the final MarkdownV2 response.
+    """
+    
+    def __init__(self, update: Update, bot, chat_id: int, min_chars: int = 120,
+                 min_interval: float = 1.0, limit: int = 4000):
+        """Initialize streaming reply
+        
+        Args:
+            update: Telegram update to reply to
+            bot: Telegram bot instance used for edits
+            chat_id: Chat ID where the reply is sent
+            min_chars: Characters to accumulate before the first message is sent
+            min_interval: Minimum seconds between two progress requests to the chat
+            limit: Maximum characters shown while streaming
+        """
+        self.update = update
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_chars = min_chars
+        self.min_interval = min_interval
+        self.limit = limit
+        self._text = ""
+        self._message_id = None
+        self._sent_text = None
+        self._handle = None
+        self._task = None
+        self._finished = False
+        self._lock = asyncio.Lock()
+    
+    def append(self, delta: str):
+        """Append a text delta and schedule a throttled update (event loop only)"""
+        self._text += delta
+        if self._handle is None and len(self._text) >= self.min_chars:
+            delay = _chat_request_delay(self.chat_id, self.min_interval)
+            self._handle = asyncio.get_running_loop().call_later(delay, self._start_flush)
     
-    await safe_reply_text(update, welcome_message)
+    def restart(self):
+        """Start over for a new model call; the same message is reused (event loop only)"""
+        self._text = ""
+    
+    def _start_flush(self):
+        self._task = asyncio.get_running_loop().create_task(self._flush())
+    
+    async def _flush(self):
+        """Send or edit the message with the text generated so far"""
+        self._handle = None
+        async with self._lock:
+            text = self._text[:self.limit]
+            if self._finished or not text.strip() or text == self._sent_text:
+                return
+            try:
+                # Partial Markdown rarely parses, so stream as plain text
+                if self._message_id is None:
+                    message = await self.update.message.reply_text(text)
+                    self._message_id = message.message_id
+                else:
+                    await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self._message_id, text=text)
+                self._sent_text = text
+            except Exception as e:
+                logger.warning("Failed to update streaming reply: %s", e)
+            _record_chat_request(self.chat_id)
+    
+    async def finish(self, response_text: str) -> bool:
+        """Replace the streamed text with the final response
+        
+        Args:
+            response_text: Final response text (any Markdown format)
+        
+        Returns:
+            True if the response was delivered through the streamed message,
+            False if nothing was streamed and the caller should send it
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        async with self._lock:
+            self._finished = True
+            if self._message_id is None:
+                return False
+            chunks = split_markdown_chunks(response_text)
+            try:
+                await safe_edit_message_text(self.bot, self.chat_id, self._message_id, next(chunks))
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    logger.warning("Failed to finalize streaming reply: %s", e)
+            await reply_chunks(self.update, chunks)
+            return True
 
 
-async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /clear command"""
-    user_id = update.effective_user.id
-    username = update.effective_user.username
+def require_allowed(handler):
+    """Decorator that rejects non-whitelisted users before the handler runs"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if not is_user_allowed(user.id, user.username):
+            await safe_reply_text(update, _UNAUTHORIZED_MESSAGE)
+            return
+        return await handler(update, context)
+    return wrapper
+
+
+# Updates whose handling continues after their handler returned (queued messages);
+# they are marked as processed by the task that answers them
+_deferred_updates: set = set()
+
+
+def finish_updates(context: ContextTypes.DEFAULT_TYPE, update_ids: list):
+    """Mark updates as fully processed, storing the offset off the event loop"""
+    asyncio.get_running_loop().run_in_executor(
+        None, _update_offset.finish, context.bot.id, update_ids
+    )
+
+
+async def skip_processed_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Drop updates that were already processed before a restart
     
-    # Check whitelist
-    if not is_user_allowed(user_id, username):
-        await safe_reply_text(update, "Sorry, you are not authorized to use this bot.")
-        return
+    Runs before all other handlers, so an update redelivered by Telegram after a
+    crash is not processed again.
+    """
+    if not _update_offset.start(context.bot.id, update.update_id):
+        logger.info("Skipping already processed update %s", update.update_id)
+        raise ApplicationHandlerStop
+
+
+async def finish_handled_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Mark an update as processed once all other handlers ran
     
+    Queued messages are skipped here; they are marked once answered.
+    """
+    if update.update_id in _deferred_updates:
+        _deferred_updates.discard(update.update_id)
+        return
+    finish_updates(context, [update.update_id])
+
+
+@require_allowed
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /start command"""
+    await safe_reply_text(update, _WELCOME_MESSAGE)
+
+
+@require_allowed
+async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /clear command"""
     chat_id = update.effective_chat.id
-    if chat_id in user_conversations:
-        del user_conversations[chat_id]
-    await safe_reply_text(update, "Conversation history cleared.")
+    await asyncio.get_running_loop().run_in_executor(_history_pool, user_conversations.pop, chat_id, None)
+    await safe_reply_text(update, _CLEARED_MESSAGE)
 
 
+@require_allowed
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
-    user_id = update.effective_user.id
-    username = update.effective_user.username
-    
-    # Check whitelist
-    if not is_user_allowed(user_id, username):
-        await safe_reply_text(update, "Sorry, you are not authorized to use this bot.")
-        return
-    
-    help_text = """TaskMCP Bot Help
-
-I can help you:
-- List, add, update, delete tasks
-- Manage workspaces
-- Search tasks
-- Get current time/date
+    await safe_reply_text(update, _HELP_TEXT)
 
-Examples:
-- "List all tasks"
-- "Add a task: Complete project documentation"
-- "What is the current workspace?"
-- "Mark task #1 as done"
 
-Use /clear to reset conversation history.
-Use /dump to export conversation history as JSON for debugging.
-Use /language to set your language preference."""
-    
-    await safe_reply_text(update, help_text)
+# Supported languages as shown by /language (static, so rendered once)
+_LANGUAGE_LIST = "\n".join(f"  {code}: {name}" for code, name in user_config.SUPPORTED_LANGUAGES.items())
 
 
+@require_allowed
 async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /language command - Set or view language preference"""
     user_id = update.effective_user.id
-    username = update.effective_user.username
-    
-    # Check whitelist
-    if not is_user_allowed(user_id, username):
-        await safe_reply_text(update, "Sorry, you are not authorized to use this bot.")
-        return
     
     # Get current language
-    current_language = user_config.get_user_language(user_id)
+    current_language = get_cached_user_language(user_id)
     if current_language:
         current_language_name = user_config.SUPPORTED_LANGUAGES.get(current_language, current_language)
     else:
@@ -624,6 +1051,9 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args and len(context.args) > 0:
         language_code = context.args[0].lower()
         
+        # The preference may change below; re-read it on the next message
+        _language_cache.pop(user_id, None)
+        
         if language_code == 'clear':
             # Clear language setting (remove from config)
             config = user_config.load_user_config()
@@ -650,7 +1080,7 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await safe_reply_text(update, "Failed to set language preference.")
         else:
             # Show supported languages
-            lang_list = "\n".join([f"  {code}: {name}" for code, name in user_config.SUPPORTED_LANGUAGES.items()])
+            lang_list = _LANGUAGE_LIST
             await safe_reply_text(
                 update,
                 f"Invalid language code: {language_code}\n\n"
@@ -661,7 +1091,7 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
     else:
         # Show current language and supported languages
-        lang_list = "\n".join([f"  {code}: {name}" for code, name in user_config.SUPPORTED_LANGUAGES.items()])
+        lang_list = _LANGUAGE_LIST
         current_display = f"{current_language_name}"
         if current_language:
             current_display += f" ({current_language})"
@@ -675,23 +1105,23 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+@require_allowed
 async def dump_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /dump command - Export conversation history as JSON"""
     user_id = update.effective_user.id
     username = update.effective_user.username
     chat_id = update.effective_chat.id
     
-    # Check whitelist
-    if not is_user_allowed(user_id, username):
-        await safe_reply_text(update, "Sorry, you are not authorized to use this bot.")
-        return
-    
     try:
-        # Get conversation history
-        messages = user_conversations.get(chat_id)
+        # Get conversation history (after any pending write of it)
+        messages = await asyncio.get_running_loop().run_in_executor(
+            _history_pool, user_conversations.get, chat_id
+        )
         
-        # Dump conversation to file using utility function
-        filepath, filename = dump_conversation_to_file(
+        # Dump conversation to file using utility function (off the event loop:
+        # JSON encoding and writing a long history takes a while)
+        filepath, filename = await asyncio.to_thread(
+            dump_conversation_to_file,
             user_id=user_id,
             username=username,
             chat_id=chat_id,
@@ -703,127 +1133,231 @@ async def dump_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Send file to user
         try:
-            with open(filepath, 'rb') as f:
-                document = InputFile(f, filename=filename)
-                await update.message.reply_document(
-                    document=document,
-                    caption=f"Conversation history exported\nUser ID: {user_id}\nMessage count: {conversation_count}\nFile saved to local dumps/ folder"
-                )
+            # Let the library open the file itself instead of wrapping an open handle
+            await update.message.reply_document(
+                document=Path(filepath),
+                filename=filename,
+                caption=f"Conversation history exported\nUser ID: {user_id}\nMessage count: {conversation_count}\nFile saved to local dumps/ folder"
+            )
             
             # Log file location (file is kept for debugging)
-            logger.info(f"Conversation dump saved: {filepath}")
+            logger.info("Conversation dump saved: %s", filepath)
         
         except Exception as e:
-            logger.error(f"Failed to send dump file: {e}")
+            logger.error("Failed to send dump file: %s", e)
             await safe_reply_text(update, f"Export failed: {str(e)}")
     
     except Exception as e:
-        logger.error(f"Error in dump_command: {e}")
+        logger.error("Error in dump_command: %s", e)
         await safe_reply_text(update, f"Error exporting conversation history: {str(e)}")
 
 
+async def keep_typing(bot, chat_id: int, interval: float = 4.0):
+    """Send the typing indicator repeatedly until cancelled
+    
+    Telegram clears the indicator after about 5 seconds, so it is refreshed
+    every interval seconds while a long agent turn is running.
+    """
+    while True:
+        try:
+            await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+        except Exception as e:
+            logger.debug("Failed to send typing indicator: %s", e)
+        await asyncio.sleep(interval)
+
+
+# Messages sent in quick succession (common on mobile) are answered as one turn:
+# each message waits this long for a follow-up, shorter for short messages
+_MESSAGE_BATCH_DELAY = 0.3
+_MESSAGE_BATCH_DELAY_SHORT = 0.18
+_SHORT_MESSAGE_CHARS = 320
+
+# (update ID, text) pairs waiting to be answered per chat, the debounce task waiting for more of
+# them, and the latest turn being answered (turns of one chat run in order)
+_pending_messages: Dict[int, list] = {}
+_pending_turns: Dict[int, asyncio.Task] = {}
+_running_turns: Dict[int, asyncio.Task] = {}
+
+
+@require_allowed
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle regular text messages"""
-    user_id = update.effective_user.id
-    username = update.effective_user.username
+    """Handle regular text messages
+    
+    The message is queued and answered after a short delay, together with any
+    follow-up messages that arrive in the meantime.
+    """
     chat_id = update.effective_chat.id
     user_message = update.message.text
     
     if not user_message:
         return
     
-    # Check whitelist
-    if not is_user_allowed(user_id, username):
-        await safe_reply_text(update, "Sorry, you are not authorized to use this bot.")
+    _pending_messages.setdefault(chat_id, []).append((update.update_id, user_message))
+    _deferred_updates.add(update.update_id)
+    
+    # Restart the wait for follow-up messages
+    pending = _pending_turns.pop(chat_id, None)
+    if pending is not None:
+        pending.cancel()
+    delay = _MESSAGE_BATCH_DELAY_SHORT if len(user_message) <= _SHORT_MESSAGE_CHARS else _MESSAGE_BATCH_DELAY
+    _pending_turns[chat_id] = context.application.create_task(
+        answer_pending_messages(update, context, delay), update=update
+    )
+
+
+async def answer_pending_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, delay: float):
+    """Answer the messages queued for a chat once no follow-up arrived for delay seconds
+    
+    Args:
+        update: Latest message update of the chat (the answer replies to it)
+        context: Handler context
+        delay: Seconds to wait for follow-up messages
+    """
+    chat_id = update.effective_chat.id
+    await asyncio.sleep(delay)
+    
+    # From here on, new messages start a new turn instead of cancelling this one
+    _pending_turns.pop(chat_id, None)
+    queued = _pending_messages.pop(chat_id, [])
+    if not queued:
         return
+    update_ids = [update_id for update_id, _ in queued]
+    user_message = "\n".join(text for _, text in queued)
     
-    # Get or create conversation history for this user
-    if chat_id not in user_conversations:
-        user_conversations[chat_id] = None
+    previous = _running_turns.get(chat_id)
+    current = asyncio.current_task()
+    _running_turns[chat_id] = current
+    try:
+        # Wait for the previous turn so this one sees its conversation history
+        if previous is not None:
+            await asyncio.wait([previous])
+        await answer_message(update, context, user_message)
+    except asyncio.CancelledError:
+        # Shutting down: leave the messages unprocessed so they are answered after a restart
+        update_ids = []
+        raise
+    finally:
+        if _running_turns.get(chat_id) is current:
+            del _running_turns[chat_id]
+        if update_ids:
+            finish_updates(context, update_ids)
+
+
+# Background history summarization per chat, so at most one runs per chat
+_compactions: Dict[int, asyncio.Future] = {}
+
+
+def schedule_history_compaction(chat_id: int, messages: list):
+    """Summarize older turns of a chat's history in the agent pool
     
-    # Send typing indicator
-    await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+    The agent appends later turns to the same list in place, so the messages
+    present now are copied and summarized. The result replaces them in the
+    stored history, with any messages added meanwhile kept after it, unless
+    a later turn is waiting or running for the chat (it stores its own copy
+    of the history) or the history was cleared or replaced.
+    """
+    if not messages or chat_id in _compactions:
+        return
+    snapshot = list(messages)
+    scheduling_turn = _running_turns.get(chat_id)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_agent_pool, compact_conversation_history, snapshot)
+    _compactions[chat_id] = future
     
-    # List to store tool call notifications (for after notifications)
-    tool_call_notifications = []
+    def store_compacted(done: asyncio.Future):
+        _compactions.pop(chat_id, None)
+        if done.cancelled():
+            return
+        if done.exception() is not None:
+            logger.warning("Conversation summarization failed: %s", done.exception())
+            return
+        compacted = done.result()
+        if (compacted is snapshot or chat_id in _pending_turns
+                or _running_turns.get(chat_id, scheduling_turn) is not scheduling_turn):
+            return
+        loop.run_in_executor(_history_pool, replace_history, compacted)
     
-    # Create async callback for immediate notifications
-    async def async_notify(notification_text: str):
-        """Async callback to immediately send notification to user
-        
-        Returns:
-            Message ID of the sent message, or None if failed
-        """
+    def replace_history(compacted: list):
         try:
-            message = await safe_reply_text(update, notification_text)
-            return message.message_id if message else None
+            current = user_conversations.get(chat_id)
+            if (current is None or len(current) < len(snapshot)
+                    or any(a is not b for a, b in zip(current, snapshot))):
+                return
+            user_conversations[chat_id] = compacted + current[len(snapshot):]
         except Exception as e:
-            logger.warning(f"Failed to send immediate tool call notification: {e}")
-            return None
+            logger.warning("Failed to store summarized conversation: %s", e)
+    
+    future.add_done_callback(store_compacted)
+
+
+async def answer_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user_message: str):
+    """Run one agent turn for user_message and send the answer"""
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
     
     # Get event loop for async operations
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
+    
+    # Get conversation history for this chat (None starts a new conversation)
+    conversation_history = await loop.run_in_executor(_history_pool, user_conversations.get, chat_id)
+    
+    # Show the typing indicator for as long as the agent runs
+    typing_task = asyncio.create_task(keep_typing(context.bot, chat_id))
+    
+    # One status message per turn, edited in place as tools progress
+    status = ToolStatusMessage(update, context.bot, chat_id)
+    
+    # Reply message that shows the answer while it is generated
+    stream = StreamingReply(update, context.bot, chat_id,
+                            min_chars=_stream_min_chars, min_interval=_stream_interval)
+    
+    def on_token(delta: str):
+        loop.call_soon_threadsafe(stream.append, delta)
+    
+    def before_chat():
+        loop.call_soon_threadsafe(stream.restart)
     
     try:
-        # Run agent with user's conversation history (in executor to avoid blocking)
+        # Run agent with user's conversation history (in the agent pool to avoid blocking)
         response_text, updated_messages = await loop.run_in_executor(
-            None,
+            _agent_pool,
             run_agent_for_telegram,
             user_message,
             _default_model,
             False,
-            user_conversations[chat_id],
-            tool_call_notifications,
-            async_notify,
+            conversation_history,
+            status.set_entry,
             loop,
             user_id,  # Pass user_id for language preference
-            context.bot,  # Pass bot for message editing
-            chat_id  # Pass chat_id for message editing
+            on_token,
+            before_chat
         )
         
-        # Send tool call after notifications to user (before notifications are sent immediately during execution)
-        # Note: 
-        # - batch_after notifications are already sent via async_notify_callback, so we skip them here
-        # - Non-batch tool 'after' notifications are also sent immediately via callback and not added to this list
-        # - This loop now mainly handles 'before' notifications if needed in the future
-        for notification_type, tool_name, args, result in tool_call_notifications:
-            # Skip batch_after notifications (already sent via callback)
-            if notification_type == 'batch_after':
-                continue
-            
-            # Handle "after" notifications (should not occur for non-batch tools, but kept for compatibility)
-            if notification_type == 'after':
-                # Format tool name for display (replace underscores with spaces, capitalize)
-                tool_display = tool_name.replace('_', ' ').title()
-                
-                # After tool call notification
-                notification_text = f"✅ Tool execution completed: *{tool_display}*"
-                if result is not None:
-                    result_str = str(result)
-                    if len(result_str) > 200:
-                        result_str = result_str[:200] + "..."
-                    notification_text += f"\nResult: `{result_str}`"
-                
-                try:
-                    await safe_reply_text(update, notification_text)
-                except Exception as e:
-                    logger.warning(f"Failed to send tool call after notification: {e}")
+        typing_task.cancel()
+        
+        # Show the final tool status before the answer
+        await status.finish()
         
         # Update conversation history
-        user_conversations[chat_id] = updated_messages
+        await loop.run_in_executor(_history_pool, user_conversations.__setitem__, chat_id, updated_messages)
         
         # Send response (Telegram has 4096 character limit, so we may need to split)
-        if len(response_text) > 4096:
-            # Split into chunks
-            chunks = [response_text[i:i+4096] for i in range(0, len(response_text), 4096)]
-            for chunk in chunks:
-                await safe_reply_text(update, chunk)
-        else:
-            await safe_reply_text(update, response_text)
+        # If the answer was streamed, the streamed message is edited into the final response
+        if not await stream.finish(response_text):
+            if len(response_text) <= 4000:
+                await safe_reply_text(update, response_text)
+            else:
+                # Split at paragraph/code block boundaries so each chunk parses as MarkdownV2
+                await reply_chunks(update, split_markdown_chunks(response_text))
+        
+        # Summarize older turns now that the user has the answer
+        schedule_history_compaction(chat_id, updated_messages)
     
     except Exception as e:
         error_message = f"Error processing your request: {str(e)}"
         await safe_reply_text(update, error_message)
+    finally:
+        typing_task.cancel()
 
 
 def main():
@@ -834,6 +1368,15 @@ def main():
     # This is a known issue in the library and will be fixed in future versions
     warnings.filterwarnings("ignore", category=DeprecationWarning, module="telegram")
     
+    # Use uvloop for lower event loop overhead where available
+    if sys.platform != 'win32':
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            logger.info("Using uvloop event loop")
+        except ImportError:
+            logger.warning("uvloop not installed. Install it with: pip install uvloop")
+    
     logger.info("Starting TaskMCP Telegram Bot...")
     logger.info(f"Provider: {_provider_type}, Model: {_default_model}")
     
@@ -890,20 +1433,53 @@ def main():
     except Exception as e:
         logger.warning(f"Could not log registered tools: {e}")
     
-    # Create application
-    application = Application.builder().token(_bot_token).build()
+    # Create application with explicitly sized connection pools: a large pool for
+    # outbound requests (replies, status edits) and a separate one for getUpdates
+    builder = (
+        Application.builder()
+        .token(_bot_token)
+        .connection_pool_size(64)
+        .pool_timeout(20)
+        .connect_timeout(10)
+        .read_timeout(30)
+        .get_updates_connection_pool_size(4)
+        .get_updates_pool_timeout(30)
+    )
+    
+    # Optionally talk to a self-hosted Bot API server (e.g. running next to the bot)
+    # instead of api.telegram.org
+    api_base_url = os.getenv('TELEGRAM_API_BASE_URL')
+    if api_base_url:
+        builder = builder.base_url(api_base_url)
+        api_file_url = os.getenv('TELEGRAM_API_FILE_URL')
+        if api_file_url:
+            builder = builder.base_file_url(api_file_url)
+        if os.getenv('TELEGRAM_API_LOCAL_MODE', '0') == '1':
+            builder = builder.local_mode(True)
+        logger.info(f"Using Bot API server: {api_base_url}")
+    
+    # Absorb 429 (flood control) responses instead of failing requests
+    try:
+        from telegram.ext import AIORateLimiter
+        builder = builder.rate_limiter(AIORateLimiter(max_retries=3))
+    except (ImportError, RuntimeError):
+        logger.info("Rate limiter not available. Install it with: pip install \"python-telegram-bot[rate-limiter]\"")
+    
+    application = builder.build()
     
     # Register handlers
+    application.add_handler(TypeHandler(Update, skip_processed_updates), group=-1)
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("clear", clear_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("dump", dump_command))
     application.add_handler(CommandHandler("language", language_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(TypeHandler(Update, finish_handled_update), group=1)
     
     # Start bot
     logger.info("Bot is running. Press Ctrl+C to stop.")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=False)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Telegram Bot Storage - Persistent caches for the Telegram bot
+
+This module provides SQLite-backed storage used by the Telegram bot:
+- ResponseCache: caches agent responses keyed on conversation state, with an
+  optional semantic tier that matches paraphrased queries via embeddings
+- ConversationStore: per-chat conversation history with an in-memory LRU tier
+- UpdateOffsetStore: ID of the last processed Telegram update, per bot
+"""
+
+import os
+import json
+import math
+import time
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+TELEGRAM_DATA_DIR = 'telegram_data'
+TELEGRAM_DB_FILE = os.path.join(TELEGRAM_DATA_DIR, 'telegram.db')
+
+# Default time-to-live for cached responses (seconds)
+DEFAULT_RESPONSE_TTL = 24 * 3600
+
+# Expired cache entries are deleted by the first write after this many seconds
+RESPONSE_PURGE_INTERVAL = 3600
+
+# Default cosine similarity required for a semantic cache hit
+DEFAULT_SIMILARITY_THRESHOLD = 0.93
+
+# Default number of conversations kept in memory
+DEFAULT_CONVERSATION_CACHE_SIZE = 256
+
+# Telegram restarts update IDs from a random value after a week without updates;
+# an ID this far below the stored one is taken as such a restart, not a redelivery
+UPDATE_ID_RESET_GAP = 100000
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open a SQLite connection shared between the event loop and agent threads
+    
+    The database uses write-ahead logging: the stores write after every turn and
+    update, and WAL commits append to the log instead of rewriting pages, and
+    do not block readers on the other connections.
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # Durable across application crashes; only an OS crash can lose the last commits
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class ResponseCache:
+    """Exact-match cache of agent responses keyed on conversation state
+
+    The key covers the model, no_think flag, language, full message history and
+    the query, so a hit means the model would see exactly the same input.
+    Only turns without tool calls should be stored: tool calls have side effects
+    (e.g. adding a task) and their results depend on the task database.
+    Expired entries are deleted by the writes, at most once per purge interval.
+
+    When an embedding function is provided, a second tier matches queries whose
+    embedding is close to a cached query asked against the same conversation
+    prefix (e.g. "show my tasks" vs "list my tasks").
+    """
+
+    def __init__(
+        self,
+        db_path: str = TELEGRAM_DB_FILE,
+        ttl: int = DEFAULT_RESPONSE_TTL,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD
+    ):
+        """Initialize response cache
+
+        Args:
+            db_path: SQLite database file path
+            ttl: Time-to-live for cached entries in seconds
+            embed_fn: Optional function returning an embedding vector for a text;
+                      enables the semantic tier
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.ttl = ttl
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self._next_purge = 0.0  # The first write purges entries expired while stopped
+        self._lock = threading.Lock()
+        self._conn = _connect(db_path)
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    response_text TEXT NOT NULL,
+                    messages TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS semantic_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prefix_key TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    response_text TEXT NOT NULL,
+                    messages TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_semantic_prefix ON semantic_cache (prefix_key)'
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model: Optional[str], no_think: bool, language: Optional[str],
+                 messages: Optional[list], query: Optional[str]) -> str:
+        """Build the cache key for a conversation state and query
+
+        Returns:
+            Hex digest identifying the model input
+        """
+        payload = json.dumps(
+            {'m': model, 'nt': no_think, 'l': language, 'h': messages, 'q': query},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+    @staticmethod
+    def make_prefix_key(model: Optional[str], no_think: bool, language: Optional[str],
+                        messages: Optional[list]) -> str:
+        """Build the key for a conversation state without the query
+
+        Returns:
+            Hex digest identifying the conversation prefix
+        """
+        return ResponseCache.make_key(model, no_think, language, messages, None)
+
+    def get(self, key: str) -> Optional[Tuple[str, list]]:
+        """Look up a cached response
+
+        Args:
+            key: Cache key from make_key()
+
+        Returns:
+            Tuple of (response_text, updated_messages), or None on miss
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response_text, messages, expires_at FROM response_cache WHERE key = ?',
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response_text, messages_json, expires_at = row
+        if expires_at < time.time():
+            return None
+        return response_text, json.loads(messages_json)
+
+    def set(self, key: str, response_text: str, messages: list):
+        """Store a response
+
+        Args:
+            key: Cache key from make_key()
+            response_text: Agent response text
+            messages: Updated message history returned by the agent
+        """
+        messages_json = json.dumps(messages, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, response_text, messages, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, response_text, messages_json, time.time() + self.ttl)
+            )
+            self._purge_due()
+            self._conn.commit()
+
+    def _embed(self, text: str) -> array:
+        """Embed text as a unit-length float32 vector"""
+        vector = array('f', self.embed_fn(text))
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm:
+            vector = array('f', (v / norm for v in vector))
+        return vector
+
+    def get_similar(self, prefix_key: str, query: str) -> Optional[Tuple[str, list]]:
+        """Look up a response for a paraphrase of a cached query
+
+        Args:
+            prefix_key: Key from make_prefix_key() for the current conversation
+            query: New user query
+
+        Returns:
+            Tuple of (response_text, updated_messages) with the cached user message
+            replaced by the new query, or None on miss
+        """
+        if self.embed_fn is None:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT embedding, response_text, messages FROM semantic_cache '
+                'WHERE prefix_key = ? AND expires_at >= ?',
+                (prefix_key, time.time())
+            ).fetchall()
+        if not rows:
+            return None
+
+        query_vector = self._embed(query)
+        best_score = -1.0
+        best_row = None
+        for embedding_blob, response_text, messages_json in rows:
+            cached_vector = array('f')
+            cached_vector.frombytes(embedding_blob)
+            if len(cached_vector) != len(query_vector):
+                continue
+            # Both vectors are unit length, so the dot product is the cosine similarity
+            score = sum(a * b for a, b in zip(query_vector, cached_vector))
+            if score > best_score:
+                best_score = score
+                best_row = (response_text, messages_json)
+
+        if best_row is None or best_score < self.similarity_threshold:
+            return None
+
+        response_text, messages_json = best_row
+        messages = json.loads(messages_json)
+        # Record the user's actual wording in the history
+        for message in reversed(messages):
+            if message.get('role') == 'user':
+                message['content'] = query
+                break
+        return response_text, messages
+
+    def set_similar(self, prefix_key: str, query: str, response_text: str, messages: list):
+        """Store a response in the semantic tier
+
+        Args:
+            prefix_key: Key from make_prefix_key() for the conversation before the query
+            query: User query
+            response_text: Agent response text
+            messages: Updated message history returned by the agent
+        """
+        if self.embed_fn is None:
+            return
+        embedding_blob = self._embed(query).tobytes()
+        messages_json = json.dumps(messages, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO semantic_cache (prefix_key, embedding, response_text, messages, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (prefix_key, embedding_blob, response_text, messages_json, time.time() + self.ttl)
+            )
+            self._purge_due()
+            self._conn.commit()
+
+    def _purge_due(self):
+        """Delete expired entries if the purge interval has passed (call with the lock held)"""
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + RESPONSE_PURGE_INTERVAL
+        self._conn.execute('DELETE FROM response_cache WHERE expires_at < ?', (now,))
+        self._conn.execute('DELETE FROM semantic_cache WHERE expires_at < ?', (now,))
+
+    def purge_expired(self):
+        """Remove expired entries"""
+        with self._lock:
+            self._next_purge = 0.0
+            self._purge_due()
+            self._conn.commit()
+
+
+class ConversationStore:
+    """Per-chat conversation history persisted to SQLite
+
+    Recently used conversations are kept in an in-memory LRU tier; older ones
+    are evicted from memory and reloaded from the database on demand, so
+    history survives restarts while RAM stays bounded. Writes go straight
+    through to the database.
+
+    Messages are stored one row each, ordered by a per-chat sequence number.
+    Storing a conversation again only writes the difference to what is stored:
+    messages are matched by identity with the stored ones (the agent appends to
+    the history in place, and trimming, shortening and summarizing keep the
+    untouched message objects), so an appended turn is an insert and dropped
+    old turns are a range delete, whether or not the list itself is new.
+    """
+
+    def __init__(self, db_path: str = TELEGRAM_DB_FILE, maxsize: int = DEFAULT_CONVERSATION_CACHE_SIZE):
+        """Initialize conversation store
+
+        Args:
+            db_path: SQLite database file path
+            maxsize: Maximum number of conversations kept in memory
+        """
+        self.maxsize = maxsize
+        self._memory: "OrderedDict[int, list]" = OrderedDict()
+        # (seq, message) rows in the database of each in-memory conversation
+        self._persisted: Dict[int, List[Tuple[int, dict]]] = {}
+        self._lock = threading.Lock()
+        self._conn = _connect(db_path)
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS telegram_convo_messages (
+                    chat_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    PRIMARY KEY (chat_id, seq)
+                )
+            ''')
+            self._conn.commit()
+
+    def _remember(self, chat_id: int, messages: list, persisted: List[Tuple[int, dict]]):
+        """Insert into the memory tier, evicting the least recently used entry"""
+        self._memory[chat_id] = messages
+        self._memory.move_to_end(chat_id)
+        self._persisted[chat_id] = persisted
+        while len(self._memory) > self.maxsize:
+            evicted_id, _ = self._memory.popitem(last=False)
+            self._persisted.pop(evicted_id, None)
+
+    def get(self, chat_id: int, default: Optional[list] = None) -> Optional[list]:
+        """Get conversation history for a chat
+
+        Args:
+            chat_id: Telegram chat ID
+            default: Value returned if the chat has no history
+
+        Returns:
+            Message list, or default if not found
+        """
+        with self._lock:
+            messages = self._memory.get(chat_id)
+            if messages is not None:
+                self._memory.move_to_end(chat_id)
+                return messages
+            rows = self._conn.execute(
+                'SELECT seq, message FROM telegram_convo_messages WHERE chat_id = ? ORDER BY seq', (chat_id,)
+            ).fetchall()
+            if not rows:
+                return default
+            persisted = [(seq, json.loads(message)) for seq, message in rows]
+            messages = [message for _, message in persisted]
+            self._remember(chat_id, messages, persisted)
+            return messages
+
+    def __getitem__(self, chat_id: int) -> list:
+        messages = self.get(chat_id)
+        if messages is None:
+            raise KeyError(chat_id)
+        return messages
+
+    def __setitem__(self, chat_id: int, messages: list):
+        """Store conversation history for a chat
+
+        Writes to SQLite, so call it from a worker thread rather than the event loop.
+        """
+        with self._lock:
+            stored = self._persisted.get(chat_id)
+            if stored is None:
+                # Not loaded: replace whatever the database holds
+                self._conn.execute('DELETE FROM telegram_convo_messages WHERE chat_id = ?', (chat_id,))
+                stored = []
+            persisted, writes, deletes = self._diff(stored, messages)
+            self._conn.executemany(
+                'DELETE FROM telegram_convo_messages WHERE chat_id = ? AND seq > ? AND seq < ?',
+                [(chat_id, low, high) for low, high in deletes]
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO telegram_convo_messages (chat_id, seq, message) VALUES (?, ?, ?)',
+                [
+                    (chat_id, seq, json.dumps(message, ensure_ascii=False, default=str))
+                    for seq, message in writes
+                ]
+            )
+            self._conn.commit()
+            self._remember(chat_id, messages, persisted)
+
+    @staticmethod
+    def _diff(stored: List[Tuple[int, dict]], messages: list):
+        """Work out the row changes turning the stored rows into messages
+
+        Messages that are the same object as a stored one keep their row. The
+        others are written with the sequence numbers following the previous kept
+        row, replacing removed rows, as long as they fit below the next kept row;
+        otherwise every row from there on is renumbered.
+
+        Returns:
+            Tuple of (new (seq, message) rows, (seq, message) rows to write,
+            (low, high) exclusive seq ranges to delete)
+        """
+        positions = {id(message): index for index, (_, message) in enumerate(stored)}
+        persisted: List[Tuple[int, dict]] = []
+        writes: List[Tuple[int, dict]] = []
+        deletes: List[Tuple[int, int]] = []
+        next_stored = 0
+        pending: list = []
+
+        def fill_gap(high: Optional[int]) -> bool:
+            """Give the pending messages seqs below high; False if they do not fit"""
+            low = persisted[-1][0] if persisted else -1
+            if high is not None and high - low - 1 < len(pending):
+                return False
+            rows = [(low + 1 + i, message) for i, message in enumerate(pending)]
+            persisted.extend(rows)
+            writes.extend(rows)
+            pending.clear()
+            last = persisted[-1][0] if persisted else -1
+            if high is None:
+                if stored and stored[-1][0] > last:
+                    deletes.append((last, stored[-1][0] + 1))
+            elif high - last > 1:
+                deletes.append((last, high))
+            return True
+
+        for message in messages:
+            index = positions.get(id(message))
+            if index is None or index < next_stored:
+                pending.append(message)
+                continue
+            if not fill_gap(stored[index][0]):
+                # No room before the next kept row: renumber everything from here
+                pending.extend(messages[len(persisted) + len(pending):])
+                break
+            persisted.append(stored[index])
+            next_stored = index + 1
+        fill_gap(None)
+        return persisted, writes, deletes
+
+    def __contains__(self, chat_id: int) -> bool:
+        return self.get(chat_id) is not None
+
+    def pop(self, chat_id: int, default: Optional[list] = None) -> Optional[list]:
+        """Remove and return conversation history for a chat
+
+        Args:
+            chat_id: Telegram chat ID
+            default: Value returned if the chat has no history
+
+        Returns:
+            Removed message list, or default if not found
+        """
+        messages = self.get(chat_id, default)
+        with self._lock:
+            self._memory.pop(chat_id, None)
+            self._persisted.pop(chat_id, None)
+            self._conn.execute('DELETE FROM telegram_convo_messages WHERE chat_id = ?', (chat_id,))
+            self._conn.commit()
+        return messages
+
+    def __delitem__(self, chat_id: int):
+        if self.pop(chat_id) is None:
+            raise KeyError(chat_id)
+
+
+class UpdateOffsetStore:
+    """ID of the last processed Telegram update per bot, persisted to SQLite
+
+    Used to skip updates that Telegram delivers again after a restart, so a
+    message is not processed (and the model is not called) twice. Updates are
+    marked as started when dispatched and as finished once fully handled; the
+    stored ID is the highest one below which every update finished, so an
+    update interrupted by a crash is processed again.
+    """
+
+    def __init__(self, db_path: str = TELEGRAM_DB_FILE):
+        """Initialize update offset store
+
+        Args:
+            db_path: SQLite database file path
+        """
+        self._lock = threading.Lock()
+        self._conn = _connect(db_path)
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS bot_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            ''')
+            self._conn.commit()
+        # Per bot: stored offset, updates in progress, highest finished update
+        self._offsets: Dict[int, int] = {}
+        self._in_progress: Dict[int, Set[int]] = {}
+        self._highest_finished: Dict[int, int] = {}
+
+    def _offset(self, bot_id: int) -> int:
+        """Stored offset of a bot, loaded on first use (call with the lock held)"""
+        offset = self._offsets.get(bot_id)
+        if offset is None:
+            row = self._conn.execute(
+                'SELECT value FROM bot_state WHERE key = ?', (f'last_update_id:{bot_id}',)
+            ).fetchone()
+            offset = self._offsets[bot_id] = int(row[0]) if row else 0
+        return offset
+
+    def start(self, bot_id: int, update_id: int) -> bool:
+        """Mark an update as being processed, unless it was processed already
+
+        Args:
+            bot_id: Telegram bot ID
+            update_id: Telegram update ID
+
+        Returns:
+            False if the update was already processed and should be skipped
+        """
+        with self._lock:
+            offset = self._offset(bot_id)
+            if update_id <= offset:
+                if offset - update_id < UPDATE_ID_RESET_GAP:
+                    return False
+                # Update IDs were restarted; the stored offset no longer applies
+                self._offsets[bot_id] = 0
+                self._highest_finished[bot_id] = 0
+            self._in_progress.setdefault(bot_id, set()).add(update_id)
+            return True
+
+    def finish(self, bot_id: int, update_ids: Iterable[int]):
+        """Mark updates as fully processed and store the new offset
+
+        Writes to SQLite, so call it from a worker thread rather than the event loop.
+
+        Args:
+            bot_id: Telegram bot ID
+            update_ids: Telegram update IDs passed to start()
+        """
+        with self._lock:
+            in_progress = self._in_progress.setdefault(bot_id, set())
+            for update_id in update_ids:
+                in_progress.discard(update_id)
+                if update_id > self._highest_finished.get(bot_id, 0):
+                    self._highest_finished[bot_id] = update_id
+            if in_progress:
+                offset = min(in_progress) - 1
+            else:
+                offset = self._highest_finished.get(bot_id, 0)
+            if offset <= self._offset(bot_id):
+                return
+            self._offsets[bot_id] = offset
+            self._conn.execute(
+                'INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)',
+                (f'last_update_id:{bot_id}', str(offset))
+            )
+            self._conn.commit()
@@ -10,9 +10,14 @@ Uses telegramify-markdown library for reliable MarkdownV2 conversion.
 """
 
 import os
+import re
 import json
+import logging
+import functools
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
+
+logger = logging.getLogger(__name__)
 
 try:
     import telegramify_markdown
@@ -26,12 +31,115 @@ except ImportError:
         UserWarning
     )
 
+# Optional fast JSON serializer for conversation dumps
+try:
+    import orjson
+    
+    def _json_dumps_compact(data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    def _json_dumps_compact(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# Translation table escaping every MarkdownV2 reserved character (and backslash)
+_MARKDOWNV2_ESCAPE = str.maketrans({c: '\\' + c for c in '\\_*[]()~`>#+-=|{}.!'})
+
+
+# Patterns used by the clean_markdownv2_text fallback
+_RE_MARKDOWN_SYNTAX = re.compile(r'[`*_\[~|#>]')  # Any character the fallback may interpret
+_RE_CODE_BLOCK = re.compile(r'```[\s\S]*?```')
+_RE_INLINE_CODE = re.compile(r'`[^`\n]+`')
+_RE_LINK = re.compile(r'!?\[([^\]]*)\]\(([^)]+)\)')  # Links and images
+_RE_BOLD_PAIR = re.compile(r'\*\*([^*]+)\*\*')
+# Header and blockquote markers at the start of any line ([^\S\n] is whitespace
+# other than a line break, so a marker never swallows the next line)
+_RE_HEADER = re.compile(r'^#{1,6}[^\S\n]+(.+)$', re.MULTILINE)
+_RE_BLOCKQUOTE = re.compile(r'^>[^\S\n]*', re.MULTILINE)
+_RE_SPOILER = re.compile(r'\|\|[^|\n]+\|\|')
+# Underline and italic never span a protected span, so snake_case names on either
+# side of code or formatting are not mistaken for italic
+_RE_UNDERLINE = re.compile(r'__[^_\n\x00]+__')
+_RE_STRIKETHROUGH = re.compile(r'~[^~\n]+~')
+_RE_BOLD = re.compile(r'(?<!\*)\*[^*\n]+\*(?!\*)')
+_RE_ITALIC = re.compile(r'(?<!_)_[^_\n\x00]+_(?!_)')
+# Placeholder for a protected span: NUL-delimited index into the span list. Contains
+# no Markdown or reserved characters, so later patterns and escaping leave it alone
+_RE_PLACEHOLDER = re.compile('\x00(\\d+)\x00')
+
+# Reserved characters only; the fallback converter leaves already escaped characters alone
+_MARKDOWNV2_FALLBACK_ESCAPE = str.maketrans({c: '\\' + c for c in '_*[]()~`>#+-=|{}.!'})
+
+
+def _escape_unescaped(text: str) -> str:
+    """Escape MarkdownV2 reserved characters not already preceded by a backslash"""
+    parts = text.split('\\')
+    # Every part after the first starts with the character following a backslash
+    return '\\'.join(
+        [parts[0].translate(_MARKDOWNV2_FALLBACK_ESCAPE)]
+        + [part[:1] + part[1:].translate(_MARKDOWNV2_FALLBACK_ESCAPE) for part in parts[1:]]
+    )
+
+
+def escape_markdownv2(text: str) -> str:
+    """Escape text so Telegram shows it literally in MarkdownV2 mode
+    
+    Unlike clean_markdownv2_text, no Markdown formatting is interpreted.
+    
+    Args:
+        text: Plain text to escape
+    
+    Returns:
+        Escaped text
+    """
+    return text.translate(_MARKDOWNV2_ESCAPE)
+
+
+def _protect(pattern: re.Pattern, text: str, spans: list) -> str:
+    """Replace pattern matches with placeholders in one pass
+    
+    The original text of each match is appended to spans and replaced by a
+    placeholder holding its index there.
+    """
+    def replace(match):
+        spans.append(match.group())
+        return f'\x00{len(spans) - 1}\x00'
+    
+    return pattern.sub(replace, text)
+
+
+def _restore(text: str, spans: list, expanding: frozenset = frozenset()) -> str:
+    """Replace placeholders created by _protect with their original text
+    
+    A span may contain placeholders of spans protected before it, which are
+    expanded recursively.
+    
+    Args:
+        text: Text containing placeholders
+        spans: Original span texts, indexed by placeholder
+        expanding: Indices currently being expanded (guards against cycles)
+    """
+    def replace(match):
+        index = int(match.group(1))
+        if index >= len(spans) or index in expanding:
+            return match.group()
+        return _restore(spans[index], spans, expanding | {index})
+    
+    return _RE_PLACEHOLDER.sub(replace, text)
+
+
+# Converted texts up to this length are memoized (one Telegram message); longer
+# texts are converted every time so the cache stays small
+_CLEAN_CACHE_MAX_CHARS = 4096
+
 
 def clean_markdownv2_text(text: str) -> str:
     """Clean text to ensure MarkdownV2 compatibility
     
     Converts Markdown text to Telegram MarkdownV2 compatible format.
     Uses telegramify-markdown library for reliable conversion.
+    Results for texts that fit in one message are memoized, so repeated texts
+    (e.g. tool notifications built from the same template) are only converted once.
     
     This function handles:
     - **bold** -> *bold*
@@ -47,188 +155,234 @@ def clean_markdownv2_text(text: str) -> str:
     Returns:
         Cleaned text compatible with MarkdownV2
     """
-    # Use telegramify-markdown if available
-    if _HAS_TELEGRAMIFY:
-        try:
-            return telegramify_markdown.markdownify(text)
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"telegramify-markdown conversion failed: {e}, falling back to basic implementation")
-    
-    # Fallback to basic implementation if telegramify-markdown is not available
-    # This is a simplified version that may not handle all edge cases
-    import re
+    if len(text) <= _CLEAN_CACHE_MAX_CHARS:
+        return _clean_markdownv2_cached(text)
+    return _clean_markdownv2(text)
+
+
+def _clean_markdownv2_telegramify(text: str) -> str:
+    """Convert Markdown text to MarkdownV2 with telegramify-markdown"""
+    try:
+        return telegramify_markdown.markdownify(text)
+    except Exception as e:
+        logger.warning(f"telegramify-markdown conversion failed: {e}, falling back to basic implementation")
+        return _clean_markdownv2_fallback(text)
+
+
+def _clean_markdownv2_fallback(text: str) -> str:
+    """Convert Markdown text to MarkdownV2 without telegramify-markdown
+    
+    This is a simplified version that may not handle all edge cases.
+    """
+    # Plain text without any Markdown syntax only needs escaping
+    if not _RE_MARKDOWN_SYNTAX.search(text):
+        return _escape_unescaped(text)
+    
+    # Protected spans (code, links, format markers), restored after escaping
+    spans = []
     
     # Protect code blocks first (they may contain any characters)
-    # Use a unique placeholder that won't appear in normal text
-    # Note: Code blocks may contain triple backticks inside them as content,
-    # so we need to match properly. Use a simple but effective approach:
-    # match from ``` to the next ``` that's at the start of a line
-    code_blocks = []
-    # Use regex to match code blocks: ``` followed by optional language,
-    # then content (which may include ```), then closing ``` at line start
-    # We'll use a simpler approach: match ```...``` but handle nested cases
-    code_block_pattern = r'```[\s\S]*?```'
-    # First, find all potential matches
-    potential_matches = list(re.finditer(code_block_pattern, text))
-    
-    # Filter out matches that are inside other code blocks
-    matches = []
-    for i, match in enumerate(potential_matches):
-        # Check if this match is inside any previous match
-        is_inside = False
-        for prev_match in matches:
-            if prev_match.start() < match.start() < prev_match.end():
-                is_inside = True
-                break
-        if not is_inside:
-            matches.append(match)
-    
-    # Replace from end to start to preserve positions
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__CODE_BLOCK_{len(matches) - 1 - i}__'
-        code_blocks.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
+    # Note: Code blocks may contain triple backticks inside them as content;
+    # the lazy pattern matches from ``` to the next ```
+    text = _protect(_RE_CODE_BLOCK, text, spans)
     
     # Protect inline code (but not code blocks)
-    inline_code = []
-    inline_code_pattern = r'`[^`\n]+`'
-    matches = list(re.finditer(inline_code_pattern, text))
-    # Replace from end to start to preserve positions
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__INLINE_CODE_{len(matches) - 1 - i}__'
-        inline_code.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
+    text = _protect(_RE_INLINE_CODE, text, spans)
     
     # Protect links [text](URL) and images ![text](URL)
     # Links must be protected before escaping special characters
-    links = []
-    # Match both regular links and image links
-    link_pattern = r'!?\[([^\]]*)\]\(([^)]+)\)'
-    matches = list(re.finditer(link_pattern, text))
-    # Replace from end to start to preserve positions
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__LINK_{len(matches) - 1 - i}__'
-        links.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
+    text = _protect(_RE_LINK, text, spans)
     
     # Replace **text** with *text* (double asterisks to single)
-    text = re.sub(r'\*\*([^*]+)\*\*', r'*\1*', text)
+    text = _RE_BOLD_PAIR.sub(r'*\1*', text)
     
     # Remove markdown headers (# ## ### etc.) - convert to plain text
-    lines = text.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        # Check if line starts with # (header)
-        header_match = re.match(r'^(#{1,6})\s+(.+)$', line)
-        if header_match:
-            # Convert header to plain text (just the text part)
-            cleaned_lines.append(header_match.group(2))
-        else:
-            cleaned_lines.append(line)
-    text = '\n'.join(cleaned_lines)
-    
-    # Remove blockquotes (> at start of line)
-    lines = text.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        # Remove > at start of line (blockquote)
-        if re.match(r'^>\s*', line):
-            # Remove > and leading space
-            cleaned_line = re.sub(r'^>\s*', '', line)
-            cleaned_lines.append(cleaned_line)
-        else:
-            cleaned_lines.append(line)
-    text = '\n'.join(cleaned_lines)
+    text = _RE_HEADER.sub(r'\1', text)
+    
+    # Remove blockquotes (> and leading space at start of line)
+    text = _RE_BLOCKQUOTE.sub('', text)
     
     # Protect MarkdownV2 format markers before escaping
     # Format markers: *bold*, _italic_, __underline__, ~strikethrough~, ||spoiler||
     # Protect in order from most specific to least specific (e.g., __underline__ before _italic_)
-    format_markers = []
     
     # Protect ||spoiler|| (most specific, contains |)
-    spoiler_pattern = r'\|\|[^|\n]+\|\|'
-    matches = list(re.finditer(spoiler_pattern, text))
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__SPOILER_{len(matches) - 1 - i}__'
-        format_markers.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
+    text = _protect(_RE_SPOILER, text, spans)
     
     # Protect __underline__ (contains double underscore, protect before _italic_)
-    underline_pattern = r'__[^_\n]+__'
-    matches = list(re.finditer(underline_pattern, text))
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__UNDERLINE_{len(matches) - 1 - i}__'
-        format_markers.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
+    text = _protect(_RE_UNDERLINE, text, spans)
     
     # Protect ~strikethrough~
-    strikethrough_pattern = r'~[^~\n]+~'
-    matches = list(re.finditer(strikethrough_pattern, text))
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__STRIKETHROUGH_{len(matches) - 1 - i}__'
-        format_markers.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
+    text = _protect(_RE_STRIKETHROUGH, text, spans)
     
     # Protect *bold* (single asterisk, not double)
-    bold_pattern = r'(?<!\*)\*[^*\n]+\*(?!\*)'
-    matches = list(re.finditer(bold_pattern, text))
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__BOLD_{len(matches) - 1 - i}__'
-        format_markers.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
+    text = _protect(_RE_BOLD, text, spans)
     
     # Protect _italic_ (single underscore, protect after __underline__)
-    italic_pattern = r'(?<!_)_[^_\n]+_(?!_)'
-    matches = list(re.finditer(italic_pattern, text))
-    for i, match in enumerate(reversed(matches)):
-        placeholder = f'__ITALIC_{len(matches) - 1 - i}__'
-        format_markers.insert(0, (match.group(), placeholder))
-        text = text[:match.start()] + placeholder + text[match.end():]
-    
-    # Protect all placeholders before escaping (to prevent escaping placeholder characters)
-    # Placeholders have format: __XXX_YYY__ (e.g., __CODE_BLOCK_0__, __LINK_1__, etc.)
-    placeholder_protection = []
-    placeholder_pattern = r'__[A-Z_]+_\d+__'
-    placeholder_matches = list(re.finditer(placeholder_pattern, text))
-    # Replace from end to start to preserve positions
-    for i, match in enumerate(reversed(placeholder_matches)):
-        # Use a safe placeholder that doesn't contain any special characters that need escaping
-        # Use only letters and numbers, with a unique prefix/suffix to avoid conflicts
-        safe_placeholder = f'PLACEHOLDERSAFE{len(placeholder_matches) - 1 - i}SAFE'
-        placeholder_protection.insert(0, (match.group(), safe_placeholder))
-        text = text[:match.start()] + safe_placeholder + text[match.end():]
+    text = _protect(_RE_ITALIC, text, spans)
     
     # Now escape special characters in remaining plain text
     # MarkdownV2 reserved characters: _ * [ ] ( ) ~ ` > # + - = | { } . !
-    # Escape them if not already escaped
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        # Escape if not already escaped (negative lookbehind for \)
-        text = re.sub(r'(?<!\\)' + re.escape(char), '\\' + char, text)
+    # Escape them if not already escaped (one translate pass instead of a regex per character)
+    text = _escape_unescaped(text)
     
-    # Restore protected placeholders (before restoring other content)
-    for original_placeholder, safe_placeholder in reversed(placeholder_protection):
-        text = text.replace(safe_placeholder, original_placeholder)
+    # Restore all protected spans in one pass
+    return _restore(text, spans)
+
+
+# Converter chosen once at import time (uncached clean_markdownv2_text)
+_clean_markdownv2 = _clean_markdownv2_telegramify if _HAS_TELEGRAMIFY else _clean_markdownv2_fallback
+_clean_markdownv2_cached = functools.lru_cache(maxsize=2048)(_clean_markdownv2)
+clean_markdownv2_text.cache_info = _clean_markdownv2_cached.cache_info
+clean_markdownv2_text.cache_clear = _clean_markdownv2_cached.cache_clear
+
+
+def split_markdown_chunks(text: str, limit: int = 4000) -> Iterator[str]:
+    """Split long Markdown text into chunks that fit in one Telegram message
     
-    # Restore in reverse order of protection:
-    # 1. Format markers (protected last, restore first)
-    for marker, placeholder in reversed(format_markers):
-        text = text.replace(placeholder, marker)
+    Splits at paragraph boundaries (blank lines) and never between the opening
+    and closing ``` of a code block, so each chunk converts to valid MarkdownV2
+    on its own. A paragraph or code block longer than the limit is split at the
+    last line break before the limit; a code block split this way is closed at
+    the end of the chunk and reopened in the next.
     
-    # 2. Links
-    for link, placeholder in reversed(links):
-        text = text.replace(placeholder, link)
+    Args:
+        text: Markdown text to split
+        limit: Maximum chunk length (kept below Telegram's 4096 character limit
+               to leave room for a closing code fence)
     
-    # 3. Code blocks and inline code
-    for code, placeholder in reversed(code_blocks):
-        text = text.replace(placeholder, code)
+    Yields:
+        Text chunks, each at most limit + 4 characters long
+    """
+    if len(text) <= limit:
+        yield text
+        return
+    
+    current = ""
+    for paragraph in text.split("\n\n"):
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        
+        # Start a new chunk unless that would cut through an open code block
+        if current and current.count("```") % 2 == 0:
+            yield current
+            current = paragraph
+        else:
+            current = candidate
+        
+        # Hard-split anything still over the limit at line breaks
+        while len(current) > limit:
+            cut = current.rfind("\n", 0, limit)
+            if cut <= 0:
+                cut = limit
+            else:
+                head = current[:cut]
+                fence = head.rfind("```")
+                if head.count("```") % 2 and not head[fence:].partition("\n")[2].strip():
+                    # Only the opening fence line would be kept: cut before it,
+                    # or inside the block's first line if the fence starts the text
+                    fence_line = head.rfind("\n", 0, fence)
+                    cut = fence_line if fence_line > 0 else limit
+            piece, rest = current[:cut], current[cut:].lstrip("\n")
+            if piece.count("```") % 2:
+                piece += "\n```"
+                rest = "```\n" + rest
+            if len(rest) >= len(current):
+                # Reopening the block would not make progress; cut at the limit
+                piece, rest = current[:limit], current[limit:]
+                if piece.count("```") % 2:
+                    piece += "\n```"
+                    rest = "```\n" + rest
+            current = rest
+            yield piece
+    
+    if current:
+        yield current
+
+
+# Hard cap on stored messages per chat (summarization runs later, and can fail
+# or leave a few very tool-heavy turns)
+_HISTORY_MAX_MESSAGES = 50
+# Tool results older than this many user turns are shortened to their beginning
+_HISTORY_FULL_TOOL_TURNS = 3
+_HISTORY_TOOL_RESULT_CHARS = 200
+_SHORTENED_TOOL_RESULT_MARKER = " ... [result shortened]"
+
+
+def shorten_old_tool_results(messages: list, keep_turns: int = _HISTORY_FULL_TOOL_TURNS,
+                             max_chars: int = _HISTORY_TOOL_RESULT_CHARS) -> list:
+    """Shorten long tool results outside the most recent turns
+    
+    Old tool results (e.g. full task lists) are rarely needed verbatim once the
+    assistant has answered from them, but are sent with every later request.
+    Message order and roles are unchanged, so tool calls keep their results.
+    
+    Args:
+        messages: Conversation history
+        keep_turns: Number of most recent user turns whose tool results are kept whole
+        max_chars: Number of characters kept from each older tool result
+    
+    Returns:
+        New message list with shortened results (or the original list if nothing changed)
+    """
+    if not messages:
+        return messages
+    user_indices = [i for i, m in enumerate(messages) if m.get('role') == 'user']
+    if len(user_indices) <= keep_turns:
+        return messages
+    cut = user_indices[-keep_turns]
+    
+    shortened = None
+    for i in range(cut):
+        message = messages[i]
+        content = message.get('content')
+        if (message.get('role') != 'tool' or not isinstance(content, str)
+                or len(content) <= max_chars or content.endswith(_SHORTENED_TOOL_RESULT_MARKER)):
+            continue
+        if shortened is None:
+            shortened = list(messages)
+        shortened[i] = {**message, 'content': content[:max_chars] + _SHORTENED_TOOL_RESULT_MARKER}
+    return shortened if shortened is not None else messages
+
+
+def trim_conversation_history(messages: list, max_messages: int = _HISTORY_MAX_MESSAGES) -> list:
+    """Drop the oldest turns so a conversation holds at most max_messages messages
+    
+    Leading system messages (system prompt, conversation summary) are always
+    kept, and the kept part starts at a user message so tool calls stay with
+    their results. The latest turn is kept whole even if it alone exceeds the cap.
     
-    for code, placeholder in reversed(inline_code):
-        text = text.replace(placeholder, code)
+    Args:
+        messages: Conversation history (system prompt first)
+        max_messages: Maximum number of messages to keep
     
-    return text
+    Returns:
+        Trimmed message list (or the original list if it is short enough)
+    """
+    if not messages or len(messages) <= max_messages:
+        return messages
+    
+    start = 0
+    while start < len(messages) and messages[start].get('role') == 'system':
+        start += 1
+    
+    # Oldest user message that still fits, else the start of the latest turn
+    first_kept = max(start, len(messages) - (max_messages - start))
+    cut = None
+    for i in range(first_kept, len(messages)):
+        if messages[i].get('role') == 'user':
+            cut = i
+            break
+    if cut is None:
+        cut = next((i for i in range(len(messages) - 1, start - 1, -1)
+                    if messages[i].get('role') == 'user'), start)
+    if cut == start:
+        return messages
+    
+    logger.info("Dropped %d oldest messages from conversation history", cut - start)
+    return messages[:start] + messages[cut:]
 
 
 def compress_tool_messages(conversation_history: Optional[list], min_batch_size: int = 3) -> list:
@@ -272,11 +426,11 @@ def compress_tool_messages(conversation_history: Optional[list], min_batch_size:
             # If we have enough consecutive messages, compress them
             if len(batch) >= min_batch_size:
                 # Create a compressed message
+                body = "\n".join(f"- {m.get('content', '')}" for m in batch)
                 compressed_msg = {
                     'role': 'tool',
                     'tool_name': tool_name,
-                    'content': f"[Batch of {len(batch)} {tool_name} calls]\n" + 
-                              "\n".join([f"- {m.get('content', '')}" for m in batch]),
+                    'content': f"[Batch of {len(batch)} {tool_name} calls]\n{body}",
                     'compressed': True,
                     'original_count': len(batch)
                 }
@@ -294,6 +448,10 @@ def compress_tool_messages(conversation_history: Optional[list], min_batch_size:
     return compressed
 
 
+# Base output directory -> its 'dumps' subdirectory, once it has been created
+_DUMPS_DIRS: Dict[Optional[str], str] = {}
+
+
 def dump_conversation_to_file(
     user_id: int,
     username: Optional[str],
@@ -330,36 +488,43 @@ def dump_conversation_to_file(
         original_count = len(conversation_history) if conversation_history else 0
         compressed_count = original_count
     
+    # One clock reading for both the dump timestamp and the file name
+    now = datetime.now()
+    
     # Prepare dump data
     dump_data: Dict[str, Any] = {
         "user_id": user_id,
         "username": username,
         "chat_id": chat_id,
-        "dump_timestamp": datetime.now().isoformat(),
+        "dump_timestamp": now.isoformat(),
         "conversation_history": compressed_history if compressed_history else None,
         "conversation_count": compressed_count,
         "original_count": original_count if compress_tools else None,
         "compressed": compress_tools and original_count != compressed_count
     }
     
-    # Convert to JSON
-    json_str = json.dumps(dump_data, ensure_ascii=False, indent=2)
-    
-    # Determine base output directory
-    if output_dir is None:
-        output_dir = os.path.dirname(__file__)
+    # Convert to compact JSON (UTF-8 encoded); pretty-print with python -m json.tool
+    json_bytes = _json_dumps_compact(dump_data)
     
-    # Create dumps subdirectory
-    dumps_dir = os.path.join(output_dir, 'dumps')
-    os.makedirs(dumps_dir, exist_ok=True)
+    # Dumps subdirectory, created on the first dump for each base directory
+    dumps_dir = _DUMPS_DIRS.get(output_dir)
+    if dumps_dir is None:
+        dumps_dir = os.path.join(output_dir or os.path.dirname(__file__), 'dumps')
+        os.makedirs(dumps_dir, exist_ok=True)
+        _DUMPS_DIRS[output_dir] = dumps_dir
     
     # Create file with timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = now.strftime('%Y%m%d_%H%M%S')
     filename = f"conversation_dump_{chat_id}_{timestamp}.json"
     filepath = os.path.join(dumps_dir, filename)
     
-    # Write to file
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(json_str)
+    # Write to file (recreating the directory if it was removed meanwhile)
+    try:
+        f = open(filepath, 'wb')
+    except FileNotFoundError:
+        os.makedirs(dumps_dir, exist_ok=True)
+        f = open(filepath, 'wb')
+    with f:
+        f.write(json_bytes)
     
     return filepath, filename
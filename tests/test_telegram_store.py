@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+task_telegram_store 回归测试
+
+运行: python -m pytest tests/test_telegram_store.py 或 python tests/test_telegram_store.py
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_telegram_store import ConversationStore, ResponseCache
+
+
+def _db_path():
+    return os.path.join(tempfile.mkdtemp(), 'telegram.db')
+
+
+def _turn(n):
+    return [{'role': 'user', 'content': f'q{n}'}, {'role': 'assistant', 'content': f'a{n}'}]
+
+
+def test_conversation_round_trip():
+    """保存的历史在新实例 (重启后) 中按原顺序读出"""
+    db_path = _db_path()
+    store = ConversationStore(db_path=db_path)
+    history = [{'role': 'system', 'content': 'prompt'}] + _turn(0)
+    store[1] = history
+    history += _turn(1)  # agent 原地追加
+    store[1] = history
+
+    assert ConversationStore(db_path=db_path)[1] == history
+    assert ConversationStore(db_path=db_path).get(2) is None
+
+
+def test_conversation_append_after_trim():
+    """裁剪后的新列表只删除旧行, 之后的追加写入新行, 重新读出与内存一致"""
+    db_path = _db_path()
+    store = ConversationStore(db_path=db_path)
+    history = [{'role': 'system', 'content': 'prompt'}]
+    for n in range(5):
+        history += _turn(n)
+    store[1] = history
+
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    trimmed = history[:1] + history[7:] + _turn(5)  # 新列表: 删掉前三轮并追加一轮
+    store[1] = trimmed
+    writes = [s for s in statements if s.startswith(('INSERT', 'DELETE'))]
+    assert len(writes) == 3  # 一次范围删除 + 两条新消息
+    assert ConversationStore(db_path=db_path)[1] == trimmed
+
+    trimmed += _turn(6)
+    store[1] = trimmed
+    # 摘要替换中间部分 (新对象), 其余消息保持不变
+    compacted = trimmed[:1] + [{'role': 'system', 'content': 'summary'}] + trimmed[5:]
+    store[1] = compacted
+    assert ConversationStore(db_path=db_path)[1] == compacted
+
+    store.pop(1)
+    assert ConversationStore(db_path=db_path).get(1) is None
+
+
+def test_response_cache_ttl_expiry():
+    """过期条目不再命中, 并在清理时从数据库删除"""
+    cache = ResponseCache(db_path=_db_path(), ttl=0.05)
+    key = ResponseCache.make_key('model', False, None, [], 'hello')
+    cache.set(key, 'hi', [{'role': 'user', 'content': 'hello'}])
+    assert cache.get(key) == ('hi', [{'role': 'user', 'content': 'hello'}])
+
+    time.sleep(0.1)
+    assert cache.get(key) is None
+    cache.purge_expired()
+    assert cache._conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0] == 0
+
+
+if __name__ == '__main__':
+    test_conversation_round_trip()
+    test_conversation_append_after_trim()
+    test_response_cache_ttl_expiry()
+    print("✓ OK")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+task_telegram_utils 回归测试
+
+运行: python -m pytest tests/test_telegram_utils.py 或 python tests/test_telegram_utils.py
+"""
+
+import os
+import re
+import sys
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_telegram_utils import (
+    split_markdown_chunks, trim_conversation_history,
+    _escape_unescaped, _protect, _restore, _clean_markdownv2_fallback, _RE_INLINE_CODE, _RE_BOLD
+)
+
+
+def test_split_code_block_with_oversized_line():
+    """代码块中单行超过限制时必须结束, 且每块都是闭合的代码块"""
+    text = "```\n" + "a" * 10000 + "\n```"
+    chunks = list(itertools.islice(split_markdown_chunks(text), 20))
+
+    assert len(chunks) < 20
+    assert all(len(chunk) <= 4004 for chunk in chunks)
+    assert all(chunk.count("```") % 2 == 0 for chunk in chunks)
+    assert "```\n```" not in chunks
+    assert sum(chunk.count("a") for chunk in chunks) == 10000
+
+
+def _escape_unescaped_reference(text):
+    """原始实现: 每个保留字符一次正则替换 (前面没有反斜杠时转义)"""
+    for char in '_*[]()~`>#+-=|{}.!':
+        text = re.sub(r'(?<!\\)' + re.escape(char), '\\' + char, text)
+    return text
+
+
+def test_escape_unescaped_with_backslashes():
+    """已转义的字符保持不变, 其余保留字符被转义 (与原始正则实现一致)"""
+    assert _escape_unescaped("a.b") == "a\\.b"
+    assert _escape_unescaped("a\\.b") == "a\\.b"
+    assert _escape_unescaped("end\\") == "end\\"
+    for text in ["1.5\\. ok!", "\\\\.", "\\", "C:\\dir\\file_1.txt", "a\\_b_c", "[x](y)\\!", ""]:
+        assert _escape_unescaped(text) == _escape_unescaped_reference(text), text
+
+
+def test_protect_restore_code_spans():
+    """代码片段 (含反斜杠) 被占位符替换, 还原后与原文完全一致"""
+    text = "run `C:\\dir\\a.exe` and *see `x\\1`*"
+    spans = []
+    protected = _protect(_RE_INLINE_CODE, text, spans)
+    assert spans == ["`C:\\dir\\a.exe`", "`x\\1`"]
+    assert "`" not in protected and "\\" not in protected
+    # 之后保护的片段可以包含之前的占位符, 还原时递归展开
+    protected = _protect(_RE_BOLD, protected, spans)
+    assert len(spans) == 3 and "\x00" in spans[2]
+    assert _restore(protected, spans) == text
+
+
+def test_fallback_keeps_code_spans_verbatim():
+    """回退转换器只转义代码片段之外的文本"""
+    text = "Path `C:\\dir\\file.txt` costs 1.5\\. ok!"
+    assert _clean_markdownv2_fallback(text) == "Path `C:\\dir\\file.txt` costs 1\\.5\\. ok\\!"
+
+
+def test_trim_keeps_tool_calls_with_results():
+    """裁剪历史时保留系统消息, 且工具调用与其结果不会被拆开"""
+    messages = [{'role': 'system', 'content': 'prompt'}]
+    for turn in range(10):
+        messages += [
+            {'role': 'user', 'content': f'q{turn}'},
+            {'role': 'assistant', 'content': '', 'tool_calls': [{'function': {'name': 'list_tasks'}}]},
+            {'role': 'tool', 'content': f'result{turn}'},
+            {'role': 'assistant', 'content': f'a{turn}'},
+        ]
+    trimmed = trim_conversation_history(messages, max_messages=10)
+
+    assert len(trimmed) <= 10
+    assert trimmed[0] is messages[0]
+    assert trimmed[1]['role'] == 'user'
+    assert trimmed[-1] is messages[-1]
+    for i, message in enumerate(trimmed):
+        if message['role'] == 'tool':
+            assert 'tool_calls' in trimmed[i - 1]
+    # 短历史原样返回
+    assert trim_conversation_history(messages[:5], max_messages=10) == messages[:5]
+
+
+def test_trim_keeps_oversized_latest_turn():
+    """最新一轮单独超过上限时也完整保留"""
+    messages = [{'role': 'system', 'content': 'prompt'}, {'role': 'user', 'content': 'old'},
+                {'role': 'assistant', 'content': 'a'}, {'role': 'user', 'content': 'new'}]
+    messages += [{'role': 'tool', 'content': str(i)} for i in range(8)]
+    trimmed = trim_conversation_history(messages, max_messages=5)
+    assert trimmed == [messages[0]] + messages[3:]
+
+
+if __name__ == '__main__':
+    test_split_code_block_with_oversized_line()
+    test_escape_unescaped_with_backslashes()
+    test_protect_restore_code_spans()
+    test_fallback_keeps_code_spans_verbatim()
+    test_trim_keeps_tool_calls_with_results()
+    test_trim_keeps_oversized_latest_turn()
+    print("✓ OK")
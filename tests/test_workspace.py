@@ -10,13 +10,16 @@ import time
 
 BASE_URL = "http://localhost:5000"
 
+# 复用同一个连接（keep-alive），避免每个请求重新建立TCP连接
+session = requests.Session()
+
 def test_workspace_api():
     """测试workspace API端点"""
     print("=== Testing Workspace API ===\n")
     
     # 1. 获取所有workspaces
     print("1. GET /api/workspaces")
-    response = requests.get(f"{BASE_URL}/api/workspaces")
+    response = session.get(f"{BASE_URL}/api/workspaces")
     data = response.json()
     print(f"   Current: {data['current']}")
     print(f"   Workspaces: {data['workspaces']}")
@@ -24,7 +27,7 @@ def test_workspace_api():
     
     # 2. 创建新workspace
     print("2. POST /api/workspace/create")
-    response = requests.post(
+    response = session.post(
         f"{BASE_URL}/api/workspace/create",
         json={"workspace": "test-workspace"}
     )
@@ -37,7 +40,7 @@ def test_workspace_api():
     
     # 3. 切换workspace
     print("3. POST /api/workspace/switch")
-    response = requests.post(
+    response = session.post(
         f"{BASE_URL}/api/workspace/switch",
         json={"workspace": "test-workspace"}
     )
@@ -50,7 +53,7 @@ def test_workspace_api():
     
     # 4. 添加todo到新workspace
     print("4. POST /add (in test-workspace)")
-    response = requests.post(
+    response = session.post(
         f"{BASE_URL}/add",
         json={"task": "Test task in new workspace", "parent_id": None}
     )
@@ -63,7 +66,7 @@ def test_workspace_api():
     
     # 5. 列出todos
     print("5. GET /api/todos")
-    response = requests.get(f"{BASE_URL}/api/todos")
+    response = session.get(f"{BASE_URL}/api/todos")
     todos = response.json()
     print(f"   Todos in test-workspace: {len(todos)}")
     if todos:
@@ -72,7 +75,7 @@ def test_workspace_api():
     
     # 6. 切换回default
     print("6. POST /api/workspace/switch (back to default)")
-    response = requests.post(
+    response = session.post(
         f"{BASE_URL}/api/workspace/switch",
         json={"workspace": "default"}
     )
@@ -85,14 +88,14 @@ def test_workspace_api():
     
     # 7. 验证不同workspace的todos是独立的
     print("7. GET /api/todos (in default)")
-    response = requests.get(f"{BASE_URL}/api/todos")
+    response = session.get(f"{BASE_URL}/api/todos")
     todos = response.json()
     print(f"   Todos in default workspace: {len(todos)}")
     print(f"   ✓ Workspaces are independent!\n")
     
     # 8. 删除test workspace
     print("8. POST /api/workspace/delete")
-    response = requests.post(
+    response = session.post(
         f"{BASE_URL}/api/workspace/delete",
         json={"workspace": "test-workspace"}
     )
@@ -116,3 +119,5 @@ if __name__ == '__main__':
         print("Please start the server first: python app.py")
     except Exception as e:
         print(f"❌ Error: {e}")
+    finally:
+        session.close()
@@ -0,0 +1,29 @@
+"""Current time/date helpers shared by the agent and the tool registry"""
+from time import localtime, strftime
+
+
+def get_current_time() -> str:
+    """Get the current time
+
+    Returns:
+        Current time as string (HH:MM:SS)
+    """
+    return strftime('%H:%M:%S', localtime())
+
+
+def get_current_date() -> str:
+    """Get the current date
+
+    Returns:
+        Current date as string (YYYY-MM-DD)
+    """
+    return strftime('%Y-%m-%d', localtime())
+
+
+def get_current_datetime() -> str:
+    """Get the current date and time
+
+    Returns:
+        Current date and time as string (YYYY-MM-DD HH:MM:SS)
+    """
+    return strftime('%Y-%m-%d %H:%M:%S', localtime())
@@ -9,11 +9,15 @@ and the system automatically generates tool definitions from function signatures
 """
 
 import inspect
-from typing import Dict, Callable, Optional, List
-from dataclasses import dataclass
+import sys
+from typing import Any, Dict, Callable, Optional, List, Set
+from dataclasses import dataclass, field
 
+# Drop the per-instance __dict__ where dataclasses support it (Python 3.10+)
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**_DATACLASS_SLOTS)
 class ToolDefinition:
     """Tool definition with metadata"""
     name: str
@@ -21,14 +25,49 @@ class ToolDefinition:
     description: str
     parameters: dict
     category: Optional[str] = None  # Optional category for grouping tools
+    # OpenAI-format tool dictionary, built once from the fields above
+    openai_dict: dict = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.openai_dict = {
+            'type': 'function',
+            'function': {
+                'name': self.name,
+                'description': self.description,
+                'parameters': self.parameters
+            }
+        }
 
 
 class ToolRegistry:
     """Universal tool registry for managing all available tools"""
     
+    # JSON schema type for each supported annotation (or default value type)
+    _TYPE_MAP: Dict[Any, str] = {
+        int: "integer",
+        float: "number",
+        bool: "boolean",
+        list: "array",
+        List: "array",
+        dict: "object",
+        Dict: "object",
+        str: "string",
+        Optional[str]: "string",
+    }
+    
     def __init__(self):
         self._tools: Dict[str, ToolDefinition] = {}
-        self._categories: Dict[str, List[str]] = {}  # category -> [tool_names]
+        self._categories: Dict[str, Set[str]] = {}  # category -> {tool_names}
+        # Derived views, rebuilt after the next change to the registered tools
+        self._tool_dicts_cache: Optional[List[dict]] = None
+        self._functions_cache: Optional[Dict[str, Callable]] = None
+        # Generated parameter schemas by function; kept across clear()
+        self._parameters_cache: Dict[Callable, dict] = {}
+    
+    def _invalidate_caches(self):
+        """Drop derived views after the registered tools changed"""
+        self._tool_dicts_cache = None
+        self._functions_cache = None
     
     def register(
         self,
@@ -52,8 +91,11 @@ class ToolRegistry:
             tool_name = name or func.__name__
             tool_description = description or (func.__doc__ or "").strip()
             
-            # Auto-generate parameters from function signature
-            parameters = self._generate_parameters(func)
+            # Auto-generate parameters from function signature (once per function;
+            # re-registering it, e.g. after clear(), reuses the stored schema)
+            parameters = self._parameters_cache.get(func)
+            if parameters is None:
+                parameters = self._parameters_cache[func] = self._generate_parameters(func)
             
             tool_def = ToolDefinition(
                 name=tool_name,
@@ -64,12 +106,11 @@ class ToolRegistry:
             )
             
             self._tools[tool_name] = tool_def
+            self._invalidate_caches()
             
             # Track by category
             if category:
-                if category not in self._categories:
-                    self._categories[category] = []
-                self._categories[category].append(tool_name)
+                self._categories.setdefault(category, set()).add(tool_name)
             
             return func
         
@@ -117,11 +158,10 @@ class ToolRegistry:
         )
         
         self._tools[name] = tool_def
+        self._invalidate_caches()
         
         if category:
-            if category not in self._categories:
-                self._categories[category] = []
-            self._categories[category].append(name)
+            self._categories.setdefault(category, set()).add(name)
     
     def _generate_parameters(self, func: Callable) -> dict:
         """Auto-generate parameters schema from function signature
@@ -177,65 +217,43 @@ class ToolRegistry:
         """
         annotation = param.annotation
         
-        # Handle type hints
-        if annotation == inspect.Parameter.empty:
-            # No annotation, try to infer from default value
-            if param.default != inspect.Parameter.empty:
-                default_type = type(param.default)
-                if default_type == int:
-                    return "integer"
-                elif default_type == float:
-                    return "number"
-                elif default_type == bool:
-                    return "boolean"
-                elif default_type == list:
-                    return "array"
-                elif default_type == dict:
-                    return "object"
-            return "string"  # Default to string
+        # No annotation: infer from the default value's type
+        if annotation is inspect.Parameter.empty:
+            if param.default is inspect.Parameter.empty:
+                return "string"  # Default to string
+            annotation = type(param.default)
         
-        # Handle type annotations
-        if annotation == int:
-            return "integer"
-        elif annotation == float:
-            return "number"
-        elif annotation == bool:
-            return "boolean"
-        elif annotation == list or annotation == List:
-            return "array"
-        elif annotation == dict or annotation == Dict:
-            return "object"
-        elif annotation == str or annotation == Optional[str]:
-            return "string"
-        else:
-            # For complex types, default to string
-            return "string"
+        # For complex types, default to string
+        try:
+            return self._TYPE_MAP.get(annotation, "string")
+        except TypeError:
+            return "string"  # Unhashable annotation
     
     def get_tool_dicts(self) -> List[dict]:
         """Get all tools as dictionaries in OpenAI format
         
+        The list is built once and shared until the registered tools change,
+        so callers must not modify it.
+        
         Returns:
             List of tool dictionaries
         """
-        tools = []
-        for tool_def in self._tools.values():
-            tools.append({
-                'type': 'function',
-                'function': {
-                    'name': tool_def.name,
-                    'description': tool_def.description,
-                    'parameters': tool_def.parameters
-                }
-            })
-        return tools
+        if self._tool_dicts_cache is None:
+            self._tool_dicts_cache = [tool_def.openai_dict for tool_def in self._tools.values()]
+        return self._tool_dicts_cache
     
     def get_available_functions(self) -> Dict[str, Callable]:
         """Get dictionary mapping tool names to functions
         
+        The dictionary is built once and shared until the registered tools
+        change, so callers must not modify it.
+        
         Returns:
             Dictionary of {tool_name: function}
         """
-        return {name: tool_def.function for name, tool_def in self._tools.items()}
+        if self._functions_cache is None:
+            self._functions_cache = {name: tool_def.function for name, tool_def in self._tools.items()}
+        return self._functions_cache
     
     def get_tools_by_category(self, category: str) -> List[str]:
         """Get tool names in a specific category
@@ -246,7 +264,7 @@ class ToolRegistry:
         Returns:
             List of tool names
         """
-        return self._categories.get(category, [])
+        return list(self._categories.get(category, ()))
     
     def get_all_categories(self) -> List[str]:
         """Get all registered categories
@@ -294,18 +312,19 @@ class ToolRegistry:
         
         # Remove from category
         if tool_def.category and tool_def.category in self._categories:
-            if name in self._categories[tool_def.category]:
-                self._categories[tool_def.category].remove(name)
+            self._categories[tool_def.category].discard(name)
             if not self._categories[tool_def.category]:
                 del self._categories[tool_def.category]
         
         del self._tools[name]
+        self._invalidate_caches()
         return True
     
     def clear(self):
         """Clear all registered tools"""
         self._tools.clear()
         self._categories.clear()
+        self._invalidate_caches()
 
 
 # Global registry instance
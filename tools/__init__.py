@@ -7,12 +7,14 @@ This module initializes all tools using the tool registry system.
 Tools can be registered here or imported from other modules.
 """
 
-from tool_registry import get_registry
-from datetime import datetime
+import os
+import logging
+import importlib
 
-# Import MCP server tools
-import mcp_server
+from tool_registry import get_registry
+import time_utils
 
+logger = logging.getLogger(__name__)
 
 
 def extract_function(tool_obj):
@@ -30,40 +32,35 @@ def initialize_tools():
     2. Built-in utility tools (time/date)
     3. Auto-discovered tools from tools/ directory
     """
+    # Imported here, as only the registration below needs the FastMCP server
+    import mcp_server
+    
     registry = get_registry()
     
     # Register FastMCP tools
-    if hasattr(mcp_server.mcp, '_tool_manager'):
-        tool_manager = mcp_server.mcp._tool_manager
-        if hasattr(tool_manager, '_tools'):
-            mcp_tools = tool_manager._tools
-            
-            for name, tool_obj in mcp_tools.items():
-                if hasattr(tool_obj, 'name') and hasattr(tool_obj, 'description') and hasattr(tool_obj, 'parameters'):
-                    # Register FastMCP tool
-                    registry.register_manual(
-                        name=tool_obj.name,
-                        function=extract_function(tool_obj),
-                        description=tool_obj.description,
-                        parameters=tool_obj.parameters,
-                        category="mcp"
-                    )
+    try:
+        mcp_tools = mcp_server.mcp._tool_manager._tools
+    except AttributeError:
+        mcp_tools = {}
     
-    # Register time/date utility tools using decorator
-    @registry.register(description="Get the current time\n\nReturns:\n    Current time as string (HH:MM:SS)", category="time")
-    def get_current_time() -> str:
-        """Get the current time"""
-        return datetime.now().strftime('%H:%M:%S')
-    
-    @registry.register(description="Get the current date\n\nReturns:\n    Current date as string (YYYY-MM-DD)", category="time")
-    def get_current_date() -> str:
-        """Get the current date"""
-        return datetime.now().strftime('%Y-%m-%d')
+    for tool_obj in mcp_tools.values():
+        try:
+            name, description, parameters = tool_obj.name, tool_obj.description, tool_obj.parameters
+        except AttributeError:
+            continue  # Not a FastMCP tool object
+        # Register FastMCP tool
+        registry.register_manual(
+            name=name,
+            function=extract_function(tool_obj),
+            description=description,
+            parameters=parameters,
+            category="mcp"
+        )
     
-    @registry.register(description="Get the current date and time\n\nReturns:\n    Current date and time as string (YYYY-MM-DD HH:MM:SS)", category="time")
-    def get_current_datetime() -> str:
-        """Get the current date and time"""
-        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # Register time/date utility tools (shared with the agent's fallback path)
+    registry.register(description="Get the current time\n\nReturns:\n    Current time as string (HH:MM:SS)", category="time")(time_utils.get_current_time)
+    registry.register(description="Get the current date\n\nReturns:\n    Current date as string (YYYY-MM-DD)", category="time")(time_utils.get_current_date)
+    registry.register(description="Get the current date and time\n\nReturns:\n    Current date and time as string (YYYY-MM-DD HH:MM:SS)", category="time")(time_utils.get_current_datetime)
     
     # Auto-discover and import all tool modules in the tools/ directory
     # This allows tools to be automatically registered when added to the tools/ directory
@@ -85,26 +82,24 @@ def _auto_discover_tool_modules(registry):
     3. Use @register_tool decorator to register tools
     4. The tool will be automatically discovered and registered on next import
     """
-    import os
-    import importlib
-    import sys
-    
     # Get the directory where this __init__.py file is located
     tools_dir = os.path.dirname(os.path.abspath(__file__))
     
     # Get all Python files in the tools directory (excluding __init__.py)
+    # (scandir entries carry their file type, saving a stat call per entry)
     tool_modules = []
-    for filename in os.listdir(tools_dir):
-        filepath = os.path.join(tools_dir, filename)
-        if os.path.isfile(filepath) and filename.endswith('.py') and filename != '__init__.py':
-            module_name = filename[:-3]  # Remove .py extension
-            tool_modules.append(module_name)
-        elif os.path.isdir(filepath) and not filename.startswith('__'):
-            # Check if it's a Python package (has __init__.py)
-            init_file = os.path.join(filepath, '__init__.py')
-            if os.path.exists(init_file):
-                # It's a package, import it
-                tool_modules.append(filename)
+    with os.scandir(tools_dir) as entries:
+        for entry in entries:
+            filename = entry.name
+            if filename.endswith('.py') and filename != '__init__.py' and entry.is_file():
+                module_name = filename[:-3]  # Remove .py extension
+                tool_modules.append(module_name)
+            elif not filename.startswith('__') and entry.is_dir():
+                # Check if it's a Python package (has __init__.py)
+                init_file = os.path.join(entry.path, '__init__.py')
+                if os.path.exists(init_file):
+                    # It's a package, import it
+                    tool_modules.append(filename)
     
     # Import each module (this triggers @register_tool decorators)
     for module_name in tool_modules:
@@ -115,13 +110,9 @@ def _auto_discover_tool_modules(registry):
             # logger.debug(f"Auto-discovered and imported tool module: {module_name}")
         except ImportError as e:
             # Log warning but don't fail - some modules might have optional dependencies
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(f"Could not import tool module '{module_name}': {e}")
         except Exception as e:
             # Log other errors but continue
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(f"Error importing tool module '{module_name}': {e}")
 
 
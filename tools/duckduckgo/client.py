@@ -6,11 +6,54 @@ DuckDuckGo Search Client - Client for performing web searches using DuckDuckGo
 This module provides functionality to search the web using DuckDuckGo search engine.
 """
 
-try:
-    from ddgs import DDGS
-    HAS_DDGS = True
-except ImportError:
-    HAS_DDGS = False
+import atexit
+import threading
+import importlib.util
+
+# Only check that ddgs is installed: it pulls in httpx, lxml and more, so the
+# import itself is deferred to the first search
+HAS_DDGS = importlib.util.find_spec('ddgs') is not None
+
+# One DDGS client per thread, reused across searches so its HTTP connections
+# stay open; a client is dropped after a failed search
+_local = threading.local()
+_open_clients = []
+
+
+def _get_ddgs():
+    """Get the calling thread's DDGS client, creating it on first use"""
+    client = getattr(_local, 'ddgs', None)
+    if client is None:
+        from ddgs import DDGS
+        
+        client = DDGS().__enter__()
+        _local.ddgs = client
+        _open_clients.append(client)
+    return client
+
+
+def _discard_ddgs():
+    """Close the calling thread's DDGS client after an error"""
+    client = getattr(_local, 'ddgs', None)
+    if client is not None:
+        _local.ddgs = None
+        _close_ddgs(client)
+
+
+def _close_ddgs(client):
+    """Close a DDGS client, ignoring errors"""
+    try:
+        _open_clients.remove(client)
+        client.__exit__(None, None, None)
+    except Exception:
+        pass
+
+
+@atexit.register
+def _close_all_ddgs():
+    """Close all DDGS clients on exit"""
+    for client in list(_open_clients):
+        _close_ddgs(client)
 
 
 def search_web(query: str, max_results: int = 5) -> str:
@@ -30,26 +73,26 @@ def search_web(query: str, max_results: int = 5) -> str:
         return "Error: ddgs module not available. Please install it with: pip install ddgs"
     
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=max_results))
-            
-            if not results:
-                return f"No results found for query: {query}"
+        ddgs = _get_ddgs()
+        
+        # Format results as they are read
+        formatted_results = []
+        for i, result in enumerate(ddgs.text(query, max_results=max_results), 1):
+            title = result.get('title', 'No title')
+            url = result.get('href', 'No URL')
+            body = result.get('body', 'No description')
             
-            # Format results
-            formatted_results = []
-            for i, result in enumerate(results, 1):
-                title = result.get('title', 'No title')
-                url = result.get('href', 'No URL')
-                body = result.get('body', 'No description')
-                
-                formatted_results.append(
-                    f"{i}. {title}\n   URL: {url}\n   {body}"
-                )
-            
-            return "\n\n".join(formatted_results)
+            formatted_results.append(
+                f"{i}. {title}\n   URL: {url}\n   {body}"
+            )
+        
+        if not formatted_results:
+            return f"No results found for query: {query}"
+        
+        return "\n\n".join(formatted_results)
     
     except Exception as e:
+        _discard_ddgs()
         return f"Error: Failed to search DuckDuckGo - {str(e)}"
 
 
@@ -70,25 +113,25 @@ def search_images(query: str, max_results: int = 5) -> str:
         return "Error: ddgs module not available. Please install it with: pip install ddgs"
     
     try:
-        with DDGS() as ddgs:
-            images = list(ddgs.images(query, max_results=max_results))
-            
-            if not images:
-                return f"No images found for query: {query}"
-            
-            # Format results
-            formatted_results = []
-            for i, img in enumerate(images, 1):
-                title = img.get('title', 'No title')
-                image_url = img.get('image', 'No image URL')
-                thumbnail = img.get('thumbnail', 'No thumbnail')
-                url = img.get('url', 'No URL')
-                
-                formatted_results.append(
-                    f"{i}. {title}\n   Image URL: {image_url}\n   Thumbnail: {thumbnail}\n   Source URL: {url}"
-                )
+        ddgs = _get_ddgs()
+        
+        # Format results as they are read
+        formatted_results = []
+        for i, img in enumerate(ddgs.images(query, max_results=max_results), 1):
+            title = img.get('title', 'No title')
+            image_url = img.get('image', 'No image URL')
+            thumbnail = img.get('thumbnail', 'No thumbnail')
+            url = img.get('url', 'No URL')
             
-            return "\n\n".join(formatted_results)
+            formatted_results.append(
+                f"{i}. {title}\n   Image URL: {image_url}\n   Thumbnail: {thumbnail}\n   Source URL: {url}"
+            )
+        
+        if not formatted_results:
+            return f"No images found for query: {query}"
+        
+        return "\n\n".join(formatted_results)
     
     except Exception as e:
+        _discard_ddgs()
         return f"Error: Failed to search DuckDuckGo images - {str(e)}"
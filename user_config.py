@@ -1,8 +1,12 @@
 """User configuration management for language preferences and other user settings"""
 import os
+import copy
 import json
+import functools
 from typing import Optional
 
+from config_file import json_loads, json_dumps_indented, stat_key, write_atomic
+
 USER_CONFIG_DIR = 'user_configs'
 USER_CONFIG_FILE = os.path.join(USER_CONFIG_DIR, 'user_config.json')
 
@@ -17,30 +21,73 @@ SUPPORTED_LANGUAGES = {
     'de': 'German (Deutsch)',
 }
 
+# System prompt instruction for each supported language
+_LANGUAGE_INSTRUCTIONS = {
+    'zh': "IMPORTANT: You must always respond in Chinese (简体中文). All your responses should be in Chinese, including explanations, confirmations, and error messages.",
+    'en': "IMPORTANT: You must always respond in English. All your responses should be in English, including explanations, confirmations, and error messages.",
+    'ja': "IMPORTANT: You must always respond in Japanese (日本語). All your responses should be in Japanese, including explanations, confirmations, and error messages.",
+    'ko': "IMPORTANT: You must always respond in Korean (한국어). All your responses should be in Korean, including explanations, confirmations, and error messages.",
+    'es': "IMPORTANT: You must always respond in Spanish (Español). All your responses should be in Spanish, including explanations, confirmations, and error messages.",
+    'fr': "IMPORTANT: You must always respond in French (Français). All your responses should be in French, including explanations, confirmations, and error messages.",
+    'de': "IMPORTANT: You must always respond in German (Deutsch). All your responses should be in German, including explanations, confirmations, and error messages.",
+}
+
 DEFAULT_LANGUAGE = None  # None means no language restriction (default to English without prompt)
 
 
+# Set once the config directory has been created by this process
+_config_dir_ready = False
+
+
 def ensure_user_config_dir():
     """Ensure user config directory exists"""
-    if not os.path.exists(USER_CONFIG_DIR):
-        os.makedirs(USER_CONFIG_DIR)
+    global _config_dir_ready
+    if _config_dir_ready:
+        return
+    os.makedirs(USER_CONFIG_DIR, exist_ok=True)
+    _config_dir_ready = True
+
+
+# (file stat key, parsed config) of the last read or write; reused until the file changes
+_config_cache = (None, None)
+
+
+def _read_user_config():
+    """Parsed user configuration, cached until the file changes on disk
+    
+    Returns the cached object itself: callers must not modify it.
+    """
+    global _config_cache
+    ensure_user_config_dir()
+    try:
+        key = stat_key(USER_CONFIG_FILE)
+    except OSError:
+        return {}
+    if key[2] == 0:
+        return {}  # Empty file, nothing to parse
+    cached_key, cached_config = _config_cache
+    if key == cached_key:
+        return cached_config
+    try:
+        with open(USER_CONFIG_FILE, 'rb') as f:
+            config = json_loads(f.read())
+    except (json.JSONDecodeError, IOError):
+        # If file is corrupted, return empty dict
+        return {}
+    _config_cache = (key, config)
+    return config
 
 
 def load_user_config():
     """Load user configuration from file
     
+    Callers get their own copy, so modifying it has no effect until it is
+    saved with save_user_config.
+    
     Returns:
         Dictionary mapping user_id to config dict
     """
-    ensure_user_config_dir()
-    if os.path.exists(USER_CONFIG_FILE):
-        try:
-            with open(USER_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            # If file is corrupted, return empty dict
-            return {}
-    return {}
+    return copy.deepcopy(_read_user_config())
 
 
 def save_user_config(config):
@@ -49,9 +96,17 @@ def save_user_config(config):
     Args:
         config: Dictionary mapping user_id to config dict
     """
+    global _config_cache
     ensure_user_config_dir()
-    with open(USER_CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    _config_cache = (None, None)
+    data = json_dumps_indented(config)
+    try:
+        write_atomic(USER_CONFIG_FILE, data)
+    except FileNotFoundError:
+        # Directory removed since it was created; create it again
+        os.makedirs(USER_CONFIG_DIR, exist_ok=True)
+        write_atomic(USER_CONFIG_FILE, data)
+    _config_cache = (stat_key(USER_CONFIG_FILE), copy.deepcopy(config))
 
 
 def get_user_language(user_id: Optional[int] = None) -> Optional[str]:
@@ -65,10 +120,10 @@ def get_user_language(user_id: Optional[int] = None) -> Optional[str]:
     """
     if user_id is None:
         # For CLI, check if there's a default language in config
-        config = load_user_config()
+        config = _read_user_config()
         return config.get('_default_language', DEFAULT_LANGUAGE)
     
-    config = load_user_config()
+    config = _read_user_config()
     user_config = config.get(str(user_id), {})
     # Return None if language is not set (use default behavior)
     return user_config.get('language', DEFAULT_LANGUAGE)
@@ -115,19 +170,10 @@ def get_language_prompt(language: Optional[str]) -> str:
     if language is None:
         return ""  # No language restriction
     
-    language_instructions = {
-        'zh': "IMPORTANT: You must always respond in Chinese (简体中文). All your responses should be in Chinese, including explanations, confirmations, and error messages.",
-        'en': "IMPORTANT: You must always respond in English. All your responses should be in English, including explanations, confirmations, and error messages.",
-        'ja': "IMPORTANT: You must always respond in Japanese (日本語). All your responses should be in Japanese, including explanations, confirmations, and error messages.",
-        'ko': "IMPORTANT: You must always respond in Korean (한국어). All your responses should be in Korean, including explanations, confirmations, and error messages.",
-        'es': "IMPORTANT: You must always respond in Spanish (Español). All your responses should be in Spanish, including explanations, confirmations, and error messages.",
-        'fr': "IMPORTANT: You must always respond in French (Français). All your responses should be in French, including explanations, confirmations, and error messages.",
-        'de': "IMPORTANT: You must always respond in German (Deutsch). All your responses should be in German, including explanations, confirmations, and error messages.",
-    }
-    
-    return language_instructions.get(language, "")
+    return _LANGUAGE_INSTRUCTIONS.get(language, "")
 
 
+@functools.lru_cache(maxsize=None)
 def list_supported_languages() -> str:
     """Get formatted list of supported languages
     
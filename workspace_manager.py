@@ -1,49 +1,93 @@
 """Shared workspace management utilities for both Flask and MCP server"""
 import os
+import re
+import copy
 import json
 import sqlite3
 
+from config_file import json_loads, json_dumps_indented, stat_key, write_atomic
+
 WORKSPACES_DIR = 'workspaces'
 DEFAULT_WORKSPACE = 'default'
 WORKSPACE_CONFIG_FILE = os.path.join(WORKSPACES_DIR, 'workspace_config.json')
 
+# Set once the workspaces directory has been created by this process
+_workspaces_dir_ready = False
+
 def ensure_workspaces_dir():
     """Ensure workspaces directory exists"""
-    if not os.path.exists(WORKSPACES_DIR):
-        os.makedirs(WORKSPACES_DIR)
+    global _workspaces_dir_ready
+    if _workspaces_dir_ready:
+        return
+    os.makedirs(WORKSPACES_DIR, exist_ok=True)
+    _workspaces_dir_ready = True
 
 def get_workspace_db_path(workspace_name):
     """Get database path for a workspace"""
     ensure_workspaces_dir()
     return os.path.join(WORKSPACES_DIR, f'{workspace_name}.db')
 
-def load_workspace_config():
-    """Load workspace configuration"""
+# (file stat key, parsed config) of the last read or write; reused until the file changes
+_config_cache = (None, None)
+
+def _read_workspace_config():
+    """Parsed workspace configuration, cached until the file changes on disk
+    (e.g. when another process switches workspace)
+    
+    Returns the cached object itself: callers must not modify it.
+    """
+    global _config_cache
     ensure_workspaces_dir()
-    # Check for old config file in root directory (migration)
-    old_config_file = 'workspace_config.json'
-    if os.path.exists(old_config_file) and not os.path.exists(WORKSPACE_CONFIG_FILE):
+    try:
+        key = stat_key(WORKSPACE_CONFIG_FILE)
+    except FileNotFoundError:
+        # Check for old config file in root directory (migration)
+        old_config_file = 'workspace_config.json'
+        if not os.path.exists(old_config_file):
+            return {'current_workspace': DEFAULT_WORKSPACE}
         # Migrate old config to workspaces directory
         with open(old_config_file, 'r', encoding='utf-8') as f:
             config = json.load(f)
         save_workspace_config(config)
         # Optionally remove old file (comment out if you want to keep it as backup)
         # os.remove(old_config_file)
+        return config
     
-    if os.path.exists(WORKSPACE_CONFIG_FILE):
-        with open(WORKSPACE_CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {'current_workspace': DEFAULT_WORKSPACE}
+    if key[2] == 0:
+        return {'current_workspace': DEFAULT_WORKSPACE}  # Empty file, nothing to parse
+    cached_key, cached_config = _config_cache
+    if key == cached_key:
+        return cached_config
+    with open(WORKSPACE_CONFIG_FILE, 'rb') as f:
+        config = json_loads(f.read())
+    _config_cache = (key, config)
+    return config
+
+def load_workspace_config():
+    """Load workspace configuration
+    
+    Callers get their own copy, so modifying it has no effect until it is
+    saved with save_workspace_config.
+    """
+    return copy.deepcopy(_read_workspace_config())
 
 def save_workspace_config(config):
     """Save workspace configuration"""
+    global _config_cache
     ensure_workspaces_dir()
-    with open(WORKSPACE_CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2)
+    _config_cache = (None, None)
+    data = json_dumps_indented(config)
+    try:
+        write_atomic(WORKSPACE_CONFIG_FILE, data)
+    except FileNotFoundError:
+        # Directory removed since it was created; create it again
+        os.makedirs(WORKSPACES_DIR, exist_ok=True)
+        write_atomic(WORKSPACE_CONFIG_FILE, data)
+    _config_cache = (stat_key(WORKSPACE_CONFIG_FILE), copy.deepcopy(config))
 
 def get_current_workspace():
     """Get current workspace name"""
-    config = load_workspace_config()
+    config = _read_workspace_config()
     return config.get('current_workspace', DEFAULT_WORKSPACE)
 
 def set_current_workspace(workspace_name):
@@ -55,14 +99,20 @@ def set_current_workspace(workspace_name):
 def list_workspaces():
     """List all available workspaces"""
     ensure_workspaces_dir()
-    workspaces = []
-    for file in os.listdir(WORKSPACES_DIR):
-        if file.endswith('.db'):
-            workspaces.append(file[:-3])  # Remove .db extension
+    # One readdir sweep; scandir entries know their type without a stat call
+    with os.scandir(WORKSPACES_DIR) as entries:
+        workspaces = [
+            entry.name[:-3]  # Remove .db extension
+            for entry in entries
+            if entry.name.endswith('.db') and entry.is_file()
+        ]
     if not workspaces:
         workspaces = [DEFAULT_WORKSPACE]
     return sorted(workspaces)
 
+# Letters and digits (any script, like str.isalnum), underscore and hyphen
+_WORKSPACE_NAME_RE = re.compile(r'[\w-]+')
+
 def validate_workspace_name(workspace_name):
     """Validate workspace name format
     
@@ -72,7 +122,7 @@ def validate_workspace_name(workspace_name):
     Returns:
         True if valid, False otherwise
     """
-    return workspace_name and all(c.isalnum() or c in ('_', '-') for c in workspace_name)
+    return bool(workspace_name) and _WORKSPACE_NAME_RE.fullmatch(workspace_name) is not None
 
 def init_db(workspace_name):
     """Initialize database for a workspace
@@ -82,8 +132,8 @@ def init_db(workspace_name):
     """
     db_path = get_workspace_db_path(workspace_name)
     conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''
+    # Both tables in one call
+    conn.executescript('''
         CREATE TABLE IF NOT EXISTS tasks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             task TEXT NOT NULL,
@@ -97,13 +147,11 @@ def init_db(workspace_name):
             board_height REAL DEFAULT 100,
             children_layout TEXT DEFAULT 'vertical',
             children_comment_display TEXT DEFAULT 'compact'
-        )
-    ''')
-    c.execute('''
+        );
         CREATE TABLE IF NOT EXISTS current_task (
             id INTEGER PRIMARY KEY CHECK (id = 1),
             task_id INTEGER
-        )
+        );
     ''')
     conn.commit()
     conn.close()